@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks of the Intcode backends, on the workloads of the puzzles,
+and on synthetic workloads from intcode_synth.
+
+Each workload runs with fixed inputs, the puzzle inputs, through the
+same code as its day, with that day's interpreter replaced by the
+backend being measured.  Every measurement runs in a fresh process,
+so that no compiled code or cached results carry over between them,
+and so that the peak memory is that of the one measurement.
+
+Reported for each are the wall time, the number of instructions
+executed, instructions per second, and peak resident memory.
+Instructions skipped by a backend, such as calls answered from the
+cache of intcode_memo, count as executed.
+
+Usage: benchmark.py [name ...] [results.json]
+
+Each name is a workload or a backend, and limits the run to those.
+By default, every workload is run on every backend.  If a path ending
+in .json is given, the results are also written there.
+"""
+
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import importlib
+import io
+import itertools
+import json
+import multiprocessing
+import resource
+import sys
+import time
+
+import util
+from intcode import WarmStart
+import intcode_synth
+
+backends = {'interp': 'intcode:Interpreter',
+            'jit': 'intcode_jit:BlockInterpreter',
+            'aot': 'intcode_aot:AotInterpreter',
+            'memo': 'intcode_memo:MemoInterpreter',
+           }
+
+
+def load_program(puzzle):
+    return [int(x.strip()) for x in
+            util.get_puzzle_input(puzzle).split(',')]
+
+
+@contextlib.contextmanager
+def patched(module, interpreter_class):
+    """
+    Replaces the interpreter used by a day's module.
+    """
+    prev = module.Interpreter
+    module.Interpreter = interpreter_class
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        module.Interpreter = prev
+
+
+def run_day(puzzle, interpreter_class):
+    module = importlib.import_module(puzzle)
+    with patched(module, interpreter_class):
+        module.main()
+
+
+def bench_d05(interpreter_class):
+    memory = load_program('d05')
+    for value in [1, 5]:
+        interpreter_class(memory, input_val=value).run()
+
+def bench_d07(interpreter_class):
+    import d07
+    memory = load_program('d07')
+    with patched(d07, interpreter_class):
+        for phases in [range(5), range(5,10)]:
+            max(d07.test_sequence(memory, seq)
+                for seq in itertools.permutations(phases))
+
+def bench_d09(interpreter_class):
+    memory = load_program('d09')
+    interpreter_class(memory, input_val=2).run()
+
+def bench_d13(interpreter_class):
+    import d13
+    with patched(d13, interpreter_class):
+        d13.part_b()
+
+def bench_d19(interpreter_class):
+    # The 50x50 scan of part 1, one session per location.
+    program = WarmStart(load_program('d19'), interpreter_class, pool_size=1)
+    for x in range(50):
+        for y in range(50):
+            interp = program.acquire()
+            interp.input_val = x
+            interp.iterate_until_done()
+            interp.input_val = y
+            interp.iterate_until_done()
+            program.release(interp)
+
+def bench_d23(interpreter_class):
+    import d23
+    with patched(d23, interpreter_class):
+        d23.Network(load_program('d23')).run()
+
+def synthetic(workload):
+    return lambda cls: intcode_synth.run(workload, cls)
+
+workloads = {'d05': bench_d05,
+             'd07': bench_d07,
+             'd09': bench_d09,
+             'd11': lambda cls: run_day('d11', cls),
+             'd13': bench_d13,
+             'd15': lambda cls: run_day('d15', cls),
+             'd17': lambda cls: run_day('d17', cls),
+             'd19': bench_d19,
+             'd21': lambda cls: run_day('d21', cls),
+             'd23': bench_d23,
+             'sieve': synthetic(intcode_synth.sieve(200000)),
+             'sort': synthetic(intcode_synth.bubble_sort(300, from_input=True)),
+             'fib': synthetic(intcode_synth.fibonacci(22)),
+             'stream': synthetic(intcode_synth.stream(20000, work=10)),
+            }
+
+
+def counting_class(interpreter_class):
+    """
+    Returns a subclass that counts the instructions executed by every
+    instance, including those made by fork().
+    """
+    class Counting(interpreter_class):
+        instructions = 0
+
+        def run(self, max_steps = None):
+            start = self.steps
+            try:
+                return super().run(max_steps)
+            finally:
+                Counting.instructions += self.steps - start
+
+    return Counting
+
+
+def measure(workload, backend):
+    """
+    Runs one workload on one backend.  Called in a fresh process.
+    """
+    module, name = backends[backend].split(':')
+    interpreter_class = counting_class(getattr(importlib.import_module(module), name))
+
+    start = time.perf_counter()
+    workloads[workload](interpreter_class)
+    elapsed = time.perf_counter() - start
+
+    instructions = interpreter_class.instructions
+    # Kilobytes, on Linux.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'workload': workload,
+            'backend': backend,
+            'time': elapsed,
+            'instructions': instructions,
+            'ips': instructions / elapsed,
+            'peak_memory_mb': peak / 1024,
+           }
+
+
+def main():
+    args = sys.argv[1:]
+    json_path = next((arg for arg in args if arg.endswith('.json')), None)
+    names = [arg for arg in args if arg != json_path]
+
+    unknown = [name for name in names
+               if name not in workloads and name not in backends]
+    if unknown:
+        print(__doc__)
+        print('Unknown workload or backend:', ', '.join(unknown))
+        return
+
+    selected_workloads = [name for name in workloads if name in names] or list(workloads)
+    selected_backends = [name for name in backends if name in names] or list(backends)
+
+    print('{:8s} {:8s} {:>9s} {:>12s} {:>10s} {:>8s}'.format(
+        'workload', 'backend', 'time (s)', 'instructions', 'MIPS', 'peak MB'))
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for workload in selected_workloads:
+        for backend in selected_backends:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                result = pool.submit(measure, workload, backend).result()
+            results.append(result)
+            print('{workload:8s} {backend:8s} {time:9.3f} {instructions:12d} '
+                  '{mips:10.3f} {peak_memory_mb:8.1f}'.format(
+                      mips=result['ips']/1e6, **result))
+
+    if json_path is not None:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
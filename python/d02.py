@@ -1,41 +1,10 @@
 #!/usr/bin/env python3
 
-import util
-
-class Interpreter:
-    def __init__(self, memory):
-        self.memory = memory
-        self.ip = 0
-
-    def iteration(self):
-        opcode = self.memory[self.ip]
-        if opcode == 99:
-            return True
-
-        ai = self.memory[self.ip+1]
-        a = self.memory[ai]
-        bi = self.memory[self.ip+2]
-        b = self.memory[bi]
-
-        if opcode == 1:
-            x = a+b
-        elif opcode == 2:
-            x = a*b
-        else:
-            raise ValueError('Unknown opcode: {}'.format(opcode))
-
-        xi = self.memory[self.ip+3]
-        self.memory[xi] = x
-        self.ip += 4
-
-        return False
-
-    def iterate_until_done(self):
-        done = False
-        while not done:
-            done = self.iteration()
-
+import numpy as np
 
+import util
+from intcode import Interpreter
+from intcode_numpy import BatchInterpreter
 
 def apply_func(a, b, memory):
     memory = memory[:]
@@ -54,11 +23,19 @@ def main():
 
     print(apply_func(12, 2, memory))
 
-    for a in range(100):
-        for b in range(100):
-            output = apply_func(a, b, memory)
-            if output == 19690720:
-                print(a,b)
+    # Every noun/verb pair, run together as one batch.
+    nouns, verbs = np.meshgrid(range(100), range(100), indexing='ij')
+    nouns = nouns.ravel()
+    verbs = verbs.ravel()
+
+    batch = BatchInterpreter.from_program(memory, len(nouns))
+    batch.memory[:,1] = nouns
+    batch.memory[:,2] = verbs
+    batch.run()
+
+    found = batch.memory[:,0] == 19690720
+    for a,b in zip(nouns[found], verbs[found]):
+        print(a,b)
 
 if __name__ == '__main__':
     main()
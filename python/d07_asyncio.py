@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""
+Usage: d07_asyncio.py [benchmark]
+
+With "benchmark", times every phase sequence of the feedback loop
+with the generator (d07), threaded (d07_threading), and asyncio
+versions of test_sequence.
+"""
+
+import asyncio
+import itertools
+import sys
+import time
+
+import util
+from intcode_async import AsyncInterpreter
+
+async def run_sequence(memory, seq):
+    interpreters = [AsyncInterpreter(memory) for phase_setting in seq]
+
+    for interp_a,interp_b in zip(interpreters, interpreters[1:]+interpreters[:1]):
+        interp_a.output_channel = interp_b.input_channel
+
+    for interp,phase_setting in zip(interpreters,seq):
+        interp.input_channel.put_nowait(phase_setting)
+
+    interpreters[0].input_channel.put_nowait(0)
+
+    await asyncio.gather(*[interp.run_async() for interp in interpreters])
+
+    return interpreters[-1].output_val
+
+
+def test_sequence(memory, seq):
+    return asyncio.run(run_sequence(memory, seq))
+
+
+async def run_all(memory, seqs):
+    return await asyncio.gather(*[run_sequence(memory, seq) for seq in seqs])
+
+
+def best_sequence(memory, phases):
+    # Every sequence runs at once, in a single event loop.
+    seqs = list(itertools.permutations(phases))
+    results = asyncio.run(run_all(memory, seqs))
+    return max(zip(seqs, results), key=lambda pair:pair[1])
+
+
+def benchmark(memory):
+    import d07
+    import d07_threading
+
+    def one_at_a_time(test_sequence):
+        return lambda memory,phases: [test_sequence(memory, seq) for seq in
+                                      itertools.permutations(phases)]
+
+    versions = [('stream', one_at_a_time(d07.test_sequence)),
+                ('threading', one_at_a_time(d07_threading.test_sequence)),
+                ('asyncio', one_at_a_time(test_sequence)),
+                ('asyncio, one loop', best_sequence)]
+
+    for name,func in versions:
+        for phases in [range(5), range(5,10)]:
+            start = time.perf_counter()
+            func(memory, phases)
+            elapsed = time.perf_counter() - start
+            print('{:18s} phases {}-{}: {:.1f} ms'.format(
+                name, phases[0], phases[-1], 1000*elapsed))
+
+
+def main():
+    memory = [int(x.strip()) for x in
+              util.get_puzzle_input('d07').split(',')]
+
+    if sys.argv[1:] == ['benchmark']:
+        benchmark(memory)
+        return
+
+    for phases in [range(5), range(5,10)]:
+        print(*best_sequence(memory, phases))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import asyncio
+
+import util
+from intcode import NEEDS_INPUT
+from intcode_async import AsyncInterpreter
+
+class Network:
+    """
+    The network of d23, with each computer running as a coroutine.
+
+    A computer that finds its input channel empty is given -1.  If it
+    asks again before receiving anything, it waits on its channel
+    instead.  The network is idle once every computer is waiting and
+    no packets are in flight.
+    """
+    def __init__(self, memory, num_computers = 50):
+        self.interpreters = [AsyncInterpreter(memory,
+                                              output_callback = self.send_message)
+                             for i in range(num_computers)]
+        for i,interp in enumerate(self.interpreters):
+            interp.input_channel.put_nowait(i)
+
+        self.num_waiting = 0
+        self.idle = asyncio.Event()
+
+        self.nat_val = None
+
+    def send_message(self, addr, x, y):
+        if addr==255:
+            if self.nat_val is None:
+                print('First y NAT val stored:', y)
+            self.nat_val = (x,y)
+        else:
+            channel = self.interpreters[addr].input_channel
+            channel.put_nowait(x)
+            channel.put_nowait(y)
+
+    def is_idle(self):
+        return (self.num_waiting == len(self.interpreters) and
+                all(interp.input_channel.empty() for interp in self.interpreters))
+
+    async def run_computer(self, interp):
+        reads_at_poll = None
+        while interp.run() == NEEDS_INPUT:
+            if interp.channel_reads != reads_at_poll:
+                reads_at_poll = interp.channel_reads
+                interp.input_val = -1
+                continue
+
+            self.num_waiting += 1
+            if self.is_idle():
+                self.idle.set()
+            await interp.wait_for_input()
+            self.num_waiting -= 1
+
+    async def run_nat(self):
+        prev_y_value = None
+        while True:
+            await self.idle.wait()
+            self.idle.clear()
+
+            x,y = self.nat_val
+            if y == prev_y_value:
+                return y
+            prev_y_value = y
+            self.send_message(0, x, y)
+
+    async def run_async(self):
+        computers = [asyncio.create_task(self.run_computer(interp))
+                     for interp in self.interpreters]
+        try:
+            return await self.run_nat()
+        finally:
+            for task in computers:
+                task.cancel()
+
+    def run(self):
+        return asyncio.run(self.run_async())
+
+
+def main():
+    memory = [int(x.strip()) for x in
+              util.get_puzzle_input('d23').split(',')]
+
+    network = Network(memory)
+    print('First repeated y NAT val:',network.run())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+"""
+Usage: d23_multiprocess.py [workers] [computers]
+
+The d23 network, with the computers split across worker processes.
+
+Packets between processes go through rings in shared memory, one for
+each receiving process, so that memory grows linearly with the number
+of workers.  Senders to the same ring take its lock, while the
+receiver reads without one.  Within a worker, computers are scheduled
+by d23.Scheduler, running each one until it is blocked waiting for a
+packet.
+
+A coordinator process implements the NAT.  The network is idle when
+every worker has been idle, and the number of packets sent equals the
+number received, across two consecutive checks with no change in
+between.
+"""
+
+from collections import deque
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import sys
+import time
+
+import numpy as np
+
+import util
+from d23 import Scheduler
+from intcode import Interpreter
+
+# Packets that each ring can hold.
+ring_size = 4096
+
+# Seconds to sleep while idle, rather than spinning.
+idle_sleep = 1e-4
+
+
+class Rings:
+    """
+    Shared state of every process.  Process num_workers is the
+    coordinator.
+
+    For each receiving process, a ring of (addr, x, y) packets, the
+    number of packets written to and read from it, and a lock held
+    while writing to it.  For each process, the total number of
+    packets sent and received, and whether it is idle.
+
+    The shared memory and locks are created when name is None, and
+    otherwise attached to those of an existing Rings.
+    """
+    def __init__(self, num_workers, name = None, locks = None):
+        num_procs = num_workers + 1
+        shapes = [('packets', (num_procs, ring_size, 3)),
+                  ('heads', (num_procs,)),
+                  ('tails', (num_procs,)),
+                  ('counts', (num_procs, 2)),
+                  ('idle', (num_procs,)),
+                  ('stop', (1,))]
+        size = 8*sum(int(np.prod(shape)) for _,shape in shapes)
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.locks = [multiprocessing.Lock() for _ in range(num_procs)]
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.locks = locks
+
+        offset = 0
+        for attr,shape in shapes:
+            array = np.ndarray(shape, dtype=np.int64, buffer=self.shm.buf,
+                               offset=offset)
+            if name is None:
+                array[:] = 0
+            setattr(self, attr, array)
+            offset += array.nbytes
+
+    def close(self):
+        # The arrays must be released before the buffer can be closed.
+        for attr in ['packets', 'heads', 'tails', 'counts', 'idle', 'stop']:
+            delattr(self, attr)
+        self.shm.close()
+
+    def try_send(self, src, dest, packet):
+        """
+        Writes the packet from src to the ring of dest.  Returns False
+        if the ring is full.
+        """
+        with self.locks[dest]:
+            tail = self.tails[dest]
+            if tail - self.heads[dest] >= ring_size:
+                return False
+
+            # The packet is written before the tail moves past it.
+            self.packets[dest,tail % ring_size] = packet
+            self.tails[dest] = tail + 1
+
+        self.counts[src,0] += 1
+        return True
+
+    def receive(self, dest):
+        """
+        Returns every packet waiting for dest.
+        """
+        head = self.heads[dest]
+        tail = self.tails[dest]
+        if head == tail:
+            return []
+
+        # Not idle from here on, before the packets are counted as
+        # received.
+        self.idle[dest] = 0
+        packets = [tuple(self.packets[dest,i % ring_size].tolist())
+                   for i in range(head, tail)]
+        self.heads[dest] = tail
+        self.counts[dest,1] += tail - head
+        return packets
+
+    def snapshot(self):
+        return bool(self.idle[:-1].all()), self.counts.sum(axis=0).tolist()
+
+
+def worker_for(addr, num_workers, num_computers):
+    if addr == 255:
+        return num_workers
+    return addr * num_workers // num_computers
+
+
+class Partition:
+    """
+    The computers run by one worker.
+    """
+    def __init__(self, memory, worker, num_workers, num_computers, rings):
+        self.worker = worker
+        self.num_workers = num_workers
+        self.num_computers = num_computers
+        self.rings = rings
+
+        self.addrs = [addr for addr in range(num_computers)
+                      if worker_for(addr, num_workers, num_computers) == worker]
+        self.scheduler = Scheduler(self.addrs)
+        self.interpreters = {addr: Interpreter(memory,
+                                               input_callback = self.scheduler.input_callback(addr),
+                                               output_callback = self.send_message)
+                             for addr in self.addrs}
+        self.outbox = deque()
+
+    def send_message(self, addr, x, y):
+        if addr in self.interpreters:
+            self.scheduler.deliver(addr, x, y)
+        else:
+            dest = worker_for(addr, self.num_workers, self.num_computers)
+            self.outbox.append((dest, (addr, x, y)))
+
+    def flush(self):
+        while self.outbox:
+            dest,packet = self.outbox[0]
+            if not self.rings.try_send(self.worker, dest, packet):
+                break
+            self.outbox.popleft()
+
+    def run(self):
+        rings = self.rings
+        while not rings.stop[0]:
+            packets = rings.receive(self.worker)
+            for packet in packets:
+                self.scheduler.deliver(*packet)
+
+            if self.scheduler.ready:
+                rings.idle[self.worker] = 0
+                self.scheduler.run_ready(self.interpreters)
+
+            self.flush()
+
+            if not packets and not self.scheduler.ready and not self.outbox:
+                rings.idle[self.worker] = 1
+                time.sleep(idle_sleep)
+
+
+def run_worker(memory, worker, num_workers, num_computers, shm_name, locks):
+    rings = Rings(num_workers, shm_name, locks)
+    try:
+        Partition(memory, worker, num_workers, num_computers, rings).run()
+    finally:
+        rings.close()
+
+
+def run_nat(rings, workers, num_computers):
+    num_workers = len(workers)
+    coordinator = num_workers
+    dest_of_0 = worker_for(0, num_workers, num_computers)
+
+    nat_val = None
+    prev_y_value = None
+    prev_snapshot = None
+    while True:
+        for addr,x,y in rings.receive(coordinator):
+            if nat_val is None:
+                print('First y NAT val stored:', y)
+            nat_val = (x,y)
+
+        snapshot = rings.snapshot()
+        all_idle, (sent, received) = snapshot
+        if not (all_idle and sent == received):
+            if not all(worker.is_alive() for worker in workers):
+                raise RuntimeError('Worker process exited unexpectedly')
+            prev_snapshot = None
+            time.sleep(idle_sleep)
+            continue
+
+        if snapshot != prev_snapshot:
+            # Check again, in case a worker was caught mid-update.
+            prev_snapshot = snapshot
+            time.sleep(idle_sleep)
+            continue
+
+        prev_snapshot = None
+        if nat_val[1] == prev_y_value:
+            return prev_y_value
+        prev_y_value = nat_val[1]
+        while not rings.try_send(coordinator, dest_of_0, (0,) + nat_val):
+            time.sleep(idle_sleep)
+
+
+def run_network(memory, num_workers, num_computers = 50):
+    rings = Rings(num_workers)
+    workers = [multiprocessing.Process(target=run_worker,
+                                       args=(memory, worker, num_workers,
+                                             num_computers, rings.shm.name,
+                                             rings.locks))
+               for worker in range(num_workers)]
+    for worker in workers:
+        worker.start()
+
+    try:
+        return run_nat(rings, workers, num_computers)
+    finally:
+        rings.stop[0] = 1
+        for worker in workers:
+            worker.join()
+        rings.close()
+        rings.shm.unlink()
+
+
+def main():
+    memory = [int(x.strip()) for x in
+              util.get_puzzle_input('d23').split(',')]
+
+    args = [int(arg) for arg in sys.argv[1:]]
+    num_workers = args[0] if len(args) > 0 else os.cpu_count()
+    num_computers = args[1] if len(args) > 1 else 50
+    # Any more workers would have no computers to run.
+    num_workers = min(num_workers, num_computers)
+
+    print('First repeated y NAT val:', run_network(memory, num_workers, num_computers))
+
+if __name__ == '__main__':
+    main()
@@ -8,198 +8,7 @@ import sys
 import time
 
 import util
-
-class Memory(list):
-    """
-    Implements a self-expanding memory of integers.
-    """
-    def __getitem__(self,key):
-        if key < 0:
-            raise IndexError('Negative memory pos {} not allowed.'.format(key))
-        elif key >= len(self):
-            return 0
-        else:
-            return super().__getitem__(key)
-
-    def __setitem__(self, key, value):
-        if key < 0:
-            raise IndexError('Negative memory pos {} not allowed.'.format(key))
-
-        extension_needed = (key+1) - len(self)
-        if extension_needed > 0:
-            self.extend([0]*extension_needed)
-
-        super().__setitem__(key, value)
-
-
-class Interpreter:
-    def __init__(self, memory, input_val = None, output_callback = None):
-        self.memory = Memory(memory[:])
-        self.ip = 0
-        self.output_callback = output_callback
-        self.input_val = input_val
-        self.output_val = None
-        self.done = False
-        self.paused = False
-        self.relative_base = 0
-
-    @property
-    def input_val(self):
-        return self._input_val
-
-    @input_val.setter
-    def input_val(self,val):
-        self._input_val = val
-        self.paused = False
-
-    def iteration(self):
-        opcode = self.memory[self.ip] % 100
-        if opcode == 1:
-            self.op_add()
-        elif opcode == 2:
-            self.op_mul()
-        elif opcode == 3:
-            self.op_input()
-        elif opcode == 4:
-            self.op_output()
-        elif opcode == 5:
-            self.op_jump_if_true()
-        elif opcode == 6:
-            self.op_jump_if_false()
-        elif opcode == 7:
-            self.op_lt()
-        elif opcode == 8:
-            self.op_eq()
-        elif opcode == 9:
-            self.op_adjust_relative_base()
-        elif opcode == 99:
-            pass
-        else:
-            raise ValueError('Unknown opcode: {}'.format(opcode))
-
-        self.done = (opcode == 99)
-
-    def get_mode(self,i):
-        mode = self.memory[self.ip]
-        mode = mode // (10**(i+1))
-        mode = mode % 10
-
-        return mode
-
-    def get_param(self,i):
-        mode = self.get_mode(i)
-
-        val = self.memory[self.ip+i]
-        if mode==0:
-            val = self.memory[val]
-        elif mode==1:
-            val = val
-        elif mode==2:
-            val = self.memory[val + self.relative_base]
-        else:
-            raise ValueError('Unknown mode {} at ip={}, value={}'.format(
-                mode, self.ip, self.memory[self.ip]
-            ))
-
-        return val
-
-    def set_param(self, i, val):
-        mode = self.get_mode(i)
-
-        addr = self.memory[self.ip + i]
-        if mode==0:
-            self.memory[addr] = val
-        elif mode==1:
-            raise ValueError('Cannot use mode==1 (immediate mode) for output params')
-        elif mode==2:
-            self.memory[addr + self.relative_base] = val
-
-
-    def op_add(self):
-        a = self.get_param(1)
-        b = self.get_param(2)
-
-        x = a+b
-        self.set_param(3, x)
-        self.ip += 4
-
-    def op_mul(self):
-        a = self.get_param(1)
-        b = self.get_param(2)
-
-        x = a*b
-        self.set_param(3, x)
-        self.ip += 4
-
-    def op_input(self):
-        if self.input_val is None:
-            self.paused = True
-            return
-        else:
-            x = self.input_val
-            self.input_val = None
-
-        self.set_param(1, x)
-        self.ip += 2
-
-    def op_output(self):
-        a = self.get_param(1)
-        self.output_val = a
-
-        if self.output_callback is not None:
-            self.output_callback(a)
-
-        self.ip += 2
-
-
-    def op_jump_if_true(self):
-        a = self.get_param(1)
-        b = self.get_param(2)
-
-        if a:
-            self.ip = b
-        else:
-            self.ip += 3
-
-    def op_jump_if_false(self):
-        a = self.get_param(1)
-        b = self.get_param(2)
-
-        if not a:
-            self.ip = b
-        else:
-            self.ip += 3
-
-    def op_lt(self):
-        a = self.get_param(1)
-        b = self.get_param(2)
-
-        x = int(a<b)
-        self.set_param(3, x)
-        self.ip += 4
-
-    def op_eq(self):
-        a = self.get_param(1)
-        b = self.get_param(2)
-
-        x = int(a==b)
-        self.set_param(3, x)
-        self.ip += 4
-
-
-    def op_adjust_relative_base(self):
-        a = self.get_param(1)
-        self.relative_base += a
-        self.ip += 2
-
-
-    def iterate_until_done(self):
-        while not self.done and not self.paused:
-            self.iteration()
-
-
-
-
+from intcode_aot import AotInterpreter as Interpreter
 
 def powerset(iterable):
     s = list(iterable)
@@ -211,35 +20,27 @@ def powerset(iterable):
 class TextGame:
     def __init__(self,memory):
         self.lines = []
-        self.current_line = ''
 
         self.current_room = None
         self.known_rooms = {}
 
-        self.interp = Interpreter(memory, output_callback=self.output_callback)
-        self.interp.iterate_until_done()
+        self.interp = Interpreter(memory)
+        self.read_output()
         self.on_enter_room(None)
 
         self.inventory = set()
 
-    def output_callback(self, c):
-        if c < 128:
-            c = chr(c)
-            print(c, end='')
-
-            if c=='\n':
-                self.lines.append(self.current_line)
-                self.current_line = ''
-            else:
-                self.current_line += c
-        else:
-            raise ValueError('Non-ASCII value: {}'.format(c))
+    def read_output(self):
+        for line in self.interp.read_lines():
+            if not isinstance(line, str):
+                raise ValueError('Non-ASCII value: {}'.format(line))
+            print(line)
+            self.lines.append(line)
 
     def send_command(self, command):
         print('Command =',command)
-        for c in command+'\n':
-            self.interp.input_val = ord(c)
-            self.interp.iterate_until_done()
+        self.interp.send_text(command+'\n')
+        self.read_output()
 
         if command in ['north', 'south', 'east', 'west']:
             self.on_enter_room(command)
@@ -377,6 +178,15 @@ class TextGame:
                 self.send_command('take {}'.format(item))
 
 
+    def snapshot(self):
+        return (self.interp.snapshot(), self.current_room, set(self.inventory))
+
+    def restore(self, snapshot):
+        interp_snapshot, self.current_room, inventory = snapshot
+        self.interp.restore(interp_snapshot)
+        self.inventory = set(inventory)
+
+
     def state(self):
         output = []
         for name,room in sorted(self.known_rooms.items()):
@@ -399,6 +209,9 @@ class TextGame:
         too_heavy = []
 
         all_items = sorted(self.inventory)
+        for item in all_items:
+            self.send_command('drop {}'.format(item))
+        holding_none = self.snapshot()
 
         for itemset in powerset(all_items):
             itemset = set(itemset)
@@ -406,8 +219,9 @@ class TextGame:
                 any(itemset.issubset(prev) for prev in too_light)):
                 continue
 
-            for item in list(self.inventory):
-                self.send_command('drop {}'.format(item))
+            # Start from the state with every item dropped, rather
+            # than dropping the previous attempt's items.
+            self.restore(holding_none)
             for item in itemset:
                 self.send_command('take {}'.format(item))
 
@@ -0,0 +1,1074 @@
+"""
+Shared Intcode engine, used by every day that runs an Intcode program.
+
+A single Interpreter supports each of the I/O conventions used by the
+individual days.  Input is taken from the first of these that is
+provided.
+
+- input_callback: Called with no arguments whenever a value is needed.
+- input_iter: An iterator, advanced whenever a value is needed.
+- input_queue: A queue.Queue, blocks until a value is available.
+- input_val: A single value.  If no value is available, the
+  interpreter pauses until input_val is set again.
+- feed(): Any number of values, read after input_val.
+
+Output is reported to output_callback, to output_queue, and is stored
+as output_val.  If the output callback accepts several arguments, it
+is called once that many values have been output.
+run_until_blocked() also returns every value output during the run.
+
+For ASCII programs, send_text() gives a string as input, and
+read_lines() returns the output as lines of text.
+
+Alternatively, stream() returns a generator that yields each output,
+and takes input through send().
+"""
+
+from array import array
+from collections import deque, namedtuple
+import copy
+import functools
+import hashlib
+import inspect
+import itertools
+import time
+
+
+# Reasons for Interpreter.run() to return.
+HALTED = 'halted'
+NEEDS_INPUT = 'needs input'
+STEP_LIMIT = 'step limit'
+DEADLINE = 'deadline'
+
+# Number of memory locations taken by each opcode, including the
+# opcode itself.
+instruction_sizes = {1: 4, 2: 4, 3: 2, 4: 2, 5: 3, 6: 3, 7: 4, 8: 4, 9: 2,
+                     99: 1}
+max_instruction_size = max(instruction_sizes.values())
+
+# Short name of each opcode, for reports and disassembly.
+opcode_names = {1: 'add', 2: 'mul', 3: 'in', 4: 'out', 5: 'jnz', 6: 'jz',
+                7: 'lt', 8: 'eq', 9: 'arb', 99: 'halt'}
+
+# Parameter index that is written to by each opcode.
+output_params = {1: 3, 2: 3, 3: 1, 7: 3, 8: 3}
+
+# Memory is grown ahead of time to cover every address a cached
+# instruction may touch, so long as it stays below this size.
+# Instructions reaching further are executed one at a time instead,
+# and addresses beyond it are stored sparsely.
+max_reserved_size = 1 << 20
+
+
+def make_arithmetic_handlers():
+    """
+    Generates a function for each combination of parameter modes of
+    the add, multiply, less-than, and equals opcodes.  Each function
+    performs the instruction and returns the address written to.
+    """
+    exprs = {1: '{a} + {b}',
+             2: '{a} * {b}',
+             7: 'int({a} < {b})',
+             8: 'int({a} == {b})'}
+
+    def param_source(mode, name):
+        if mode == 0:
+            return 'data[{}]'.format(name)
+        elif mode == 1:
+            return name
+        else:
+            return 'data[{}+rb]'.format(name)
+
+    handlers = {}
+    for opcode,expr in exprs.items():
+        for modes in itertools.product((0,1,2), (0,1,2), (0,2)):
+            a_mode, b_mode, c_mode = modes
+            lines = ['def handler(data, rb, a, b, c):']
+            if c_mode == 2:
+                lines.append('    c += rb')
+            lines.append('    data[c] = ' + expr.format(a=param_source(a_mode, 'a'),
+                                                       b=param_source(b_mode, 'b')))
+            lines.append('    return c')
+
+            namespace = {}
+            exec('\n'.join(lines), namespace)
+            handlers[(opcode,) + modes] = namespace['handler']
+
+    return handlers
+
+arithmetic_handlers = make_arithmetic_handlers()
+
+
+class Instruction(namedtuple('Instruction',
+                             ['handler', 'opcode',
+                              'a_mode', 'a', 'b_mode', 'b', 'c_mode', 'c',
+                              'size'])):
+    """
+    A decoded instruction.  For each parameter, the mode and the raw
+    value stored in memory is given.  For position mode, that is the
+    address read or written.  For immediate mode, it is the value
+    itself.  For relative mode, it is the offset from the relative
+    base.  Unused parameters are given as immediate zeros.
+
+    The handler performs arithmetic and comparison instructions, and
+    is None for all other opcodes.
+    """
+    __slots__ = ()
+
+    @property
+    def params(self):
+        return ((self.a_mode, self.a),
+                (self.b_mode, self.b),
+                (self.c_mode, self.c))[:self.size-1]
+
+
+@functools.lru_cache(maxsize=None)
+def decode_opcode(value):
+    """
+    Splits the value at an instruction pointer into the opcode, the
+    instruction size, the mode of each parameter, and the handler.
+    """
+    opcode = value % 100
+    if opcode not in instruction_sizes:
+        raise ValueError('Unknown opcode: {}'.format(opcode))
+
+    size = instruction_sizes[opcode]
+    modes = []
+    for i in range(1, max_instruction_size):
+        if i < size:
+            mode = (value // 10**(i+1)) % 10
+        else:
+            mode = 1
+
+        if mode not in (0, 1, 2):
+            raise ValueError('Unknown mode {} in value={}'.format(mode, value))
+        if mode == 1 and output_params.get(opcode) == i:
+            raise ValueError('Cannot use mode==1 (immediate mode) for output params')
+        modes.append(mode)
+
+    handler = arithmetic_handlers.get((opcode,) + tuple(modes))
+    return handler, opcode, size, tuple(modes)
+
+
+def decode_instruction(memory, ip):
+    handler, opcode, size, modes = decode_opcode(memory[ip])
+    args = [memory[ip+i] if i < size else 0
+            for i in range(1, max_instruction_size)]
+
+    for mode,arg in zip(modes, args):
+        if mode == 0 and arg < 0:
+            raise IndexError('Negative memory pos {} not allowed.'.format(arg))
+
+    return Instruction(handler, opcode,
+                       modes[0], args[0], modes[1], args[1], modes[2], args[2],
+                       size)
+
+
+class Memory:
+    """
+    Implements a self-expanding memory of integers.
+
+    Decoded instructions are cached by address.  A cached instruction
+    is discarded whenever one of the locations it was decoded from is
+    written, so self-modifying programs still behave correctly.
+
+    The memory is grown as instructions are decoded, so that any
+    position-mode parameter of a cached instruction can be accessed
+    directly in self.data.  The range of relative-mode offsets is
+    tracked, so that the interpreter can check which values of the
+    relative base are safe to use.
+
+    Addresses below max_reserved_size are stored densely in self.data,
+    and any further addresses in the self.sparse dict, so that a write
+    to a distant address does not allocate everything before it.
+
+    A forked memory shares its storage with the original until either
+    one is written, at which point that one takes its own copy.
+    """
+    def __init__(self, values):
+        self.data = self.make_dense(values)
+        self.sparse = {}
+        self.decoded = {}
+        self.decoded_addrs = set()
+        self.min_relative_offset = 0
+        self.max_relative_offset = 0
+        self.shared = False
+
+    def make_dense(self, values):
+        """
+        Returns the storage for addresses below max_reserved_size.  This
+        is an array of 64-bit integers, unless a value does not fit.
+        """
+        try:
+            return array('q', values)
+        except (OverflowError, TypeError):
+            return list(values)
+
+    def promote(self):
+        """
+        Switches the dense storage to a list, after a value that does
+        not fit in a 64-bit integer has been written.
+        """
+        self.data = list(self.data)
+
+    def fork(self):
+        """
+        Returns a copy of the memory, without copying the storage.
+        Must not be called while an interpreter is running on this
+        memory, such as from an I/O callback.
+        """
+        other = copy.copy(self)
+        self.shared = other.shared = True
+        return other
+
+    def unshare(self):
+        """
+        Takes a private copy of storage shared with a forked memory.
+        Called before any write.
+        """
+        self.data = self.data[:]
+        self.sparse = dict(self.sparse)
+        self.decoded = dict(self.decoded)
+        self.decoded_addrs = set(self.decoded_addrs)
+        self.shared = False
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self,key):
+        if key < 0:
+            raise IndexError('Negative memory pos {} not allowed.'.format(key))
+        elif key < len(self.data):
+            return self.data[key]
+        else:
+            return self.sparse.get(key, 0)
+
+    def __setitem__(self, key, value):
+        if key < 0:
+            raise IndexError('Negative memory pos {} not allowed.'.format(key))
+
+        if self.shared:
+            self.unshare()
+
+        if key in self.decoded_addrs:
+            self.invalidate(key)
+
+        if key >= max_reserved_size:
+            self.sparse[key] = value
+            return
+
+        self.reserve(key+1)
+        try:
+            self.data[key] = value
+        except (OverflowError, TypeError):
+            # Too large for 64 bits, or not an integer at all.
+            self.promote()
+            self.data[key] = value
+
+    def reserve(self, size):
+        """
+        Grows the dense storage to hold at least size values.  Storage
+        is doubled where possible, so that growing one address at a
+        time stays cheap.
+        """
+        extension_needed = size - len(self.data)
+        if extension_needed > 0:
+            if self.shared:
+                self.unshare()
+            doubled = min(2*len(self.data), max_reserved_size) - len(self.data)
+            extension_needed = max(extension_needed, doubled)
+            self.data.extend(itertools.repeat(0, extension_needed))
+
+    def decode(self, ip):
+        """
+        Returns the decoded instruction at ip.  The instruction is
+        cached only if every address it may access has been reserved.
+        """
+        instr = self.decoded.get(ip)
+        if instr is None:
+            # The cache and the offsets it covers belong to one memory.
+            if self.shared:
+                self.unshare()
+            instr = decode_instruction(self, ip)
+            self.decoded_addrs.update(range(ip, ip+instr.size))
+            if self.reserve_for(instr):
+                self.decoded[ip] = instr
+
+        return instr
+
+    def reserve_for(self, instr):
+        for mode,val in instr.params:
+            if mode == 0:
+                if val >= max_reserved_size:
+                    return False
+                self.reserve(val+1)
+            elif mode == 2:
+                self.min_relative_offset = min(self.min_relative_offset, val)
+                self.max_relative_offset = max(self.max_relative_offset, val)
+
+        return True
+
+    def relative_base_range(self, relative_base):
+        """
+        Returns the range of relative bases for which every cached
+        relative-mode parameter can be accessed directly in self.data,
+        reserving memory if needed.  The range is returned as an
+        inclusive (min, max) pair.
+        """
+        needed = relative_base + self.max_relative_offset + 1
+        if needed <= max_reserved_size:
+            self.reserve(needed)
+
+        return (-self.min_relative_offset,
+                len(self.data) - 1 - self.max_relative_offset)
+
+    def unmodified(self, other, addrs):
+        return all(self[addr] == other[addr] for addr in addrs)
+
+    def learn_from(self, other):
+        """
+        Adds the instructions cached by other, a memory forked from
+        this one, wherever other has not modified them.
+        """
+        new = [(ip,instr) for ip,instr in other.decoded.items()
+               if ip not in self.decoded and
+               self.unmodified(other, range(ip, ip+instr.size))]
+        if not new:
+            return
+
+        if self.shared:
+            self.unshare()
+        for ip,instr in new:
+            self.decoded_addrs.update(range(ip, ip+instr.size))
+            if self.reserve_for(instr):
+                self.decoded[ip] = instr
+
+    def invalidate(self, addr):
+        for ip in range(addr-max_instruction_size+1, addr+1):
+            instr = self.decoded.get(ip)
+            if instr is not None and addr < ip+instr.size:
+                del self.decoded[ip]
+
+
+def num_callback_args(callback):
+    """
+    Returns the number of output values passed to each call of the
+    callback.  Callbacks with *args, such as print, take one value at
+    a time.
+    """
+    try:
+        signature = inspect.signature(callback)
+    except (ValueError, TypeError):
+        return 1
+
+    positional = (inspect.Parameter.POSITIONAL_ONLY,
+                  inspect.Parameter.POSITIONAL_OR_KEYWORD)
+    num_args = sum(1 for param in signature.parameters.values()
+                   if param.kind in positional)
+    return max(num_args, 1)
+
+
+# State of an interpreter, as returned by Interpreter.snapshot().
+Snapshot = namedtuple('Snapshot',
+                      ['memory', 'ip', 'relative_base', 'done', 'paused',
+                       'input_val', 'input_buffer', 'output_callback_params',
+                       'output_val', 'text_output', 'steps'])
+
+# Result of Interpreter.iterate_until_done().
+RunResult = namedtuple('RunResult', ['reason', 'steps'])
+
+# Constructor arguments that may be replaced in Interpreter.fork().
+io_args = ('input_val', 'input_callback', 'input_iter', 'input_queue',
+           'output_callback', 'num_output_args', 'output_queue')
+
+
+class Interpreter:
+    memory_class = Memory
+
+    # Set to an intcode_profile.Profiler, on an instance or on the
+    # class, to profile every instruction executed.
+    profiler = None
+
+    # Set to an intcode_trace.Tracer, on an instance or on the class,
+    # to record the most recent instructions executed.
+    tracer = None
+
+    # Set to an intcode_replay.Recorder on the class, before creating
+    # interpreters, to record the I/O of each one.
+    recorder = None
+
+    # Number of instructions run between checks of the clock, when
+    # iterate_until_done() is given a deadline.
+    deadline_check_steps = 10000
+
+    def __init__(self, memory, input_val = None,
+                 input_callback = None, input_iter = None, input_queue = None,
+                 output_callback = None, num_output_args = None,
+                 output_queue = None):
+        self.memory = self.memory_class(memory)
+        self.ip = 0
+        self.relative_base = 0
+
+        self.input_callback = input_callback
+        self.input_iter = input_iter
+        self.input_queue = input_queue
+        self.input_val = input_val
+
+        self.output_callback = output_callback
+        if num_output_args is None and output_callback is not None:
+            num_output_args = num_callback_args(output_callback)
+        self.num_output_args = num_output_args
+        self.output_callback_params = []
+        self.output_queue = output_queue
+        self.output_val = None
+
+        self.input_buffer = deque()
+        self.output_buffer = None
+        self.text_output = []
+
+        self.done = False
+        self.paused = False
+        self.steps = 0
+
+        if self.recorder is not None:
+            self.recorder.start(self, memory)
+
+    @property
+    def input_val(self):
+        return self._input_val
+
+    @input_val.setter
+    def input_val(self,val):
+        self._input_val = val
+        self.paused = False
+
+    def snapshot(self):
+        """
+        Returns the current state, to be passed to restore().  Memory is
+        shared until written, so this is cheap.  The I/O sources are
+        not part of the state.
+        """
+        snapshot = Snapshot(self.memory.fork(), self.ip, self.relative_base,
+                            self.done, self.paused, self._input_val,
+                            tuple(self.input_buffer),
+                            tuple(self.output_callback_params), self.output_val,
+                            tuple(self.text_output), self.steps)
+        if self.recorder is not None:
+            self.recorder.record_snapshot(self, snapshot)
+        return snapshot
+
+    def restore(self, snapshot):
+        """
+        Returns to a state from snapshot().  The same snapshot may be
+        restored any number of times.
+        """
+        self.memory = snapshot.memory.fork()
+        self.ip = snapshot.ip
+        self.relative_base = snapshot.relative_base
+        self.done = snapshot.done
+        self._input_val = snapshot.input_val
+        self.paused = snapshot.paused
+        self.input_buffer = deque(snapshot.input_buffer)
+        self.output_callback_params = list(snapshot.output_callback_params)
+        self.output_val = snapshot.output_val
+        self.text_output = list(snapshot.text_output)
+        self.steps = snapshot.steps
+
+        if self.recorder is not None:
+            self.recorder.record_restore(self, snapshot)
+
+    def fork(self, **kwargs):
+        """
+        Returns a new interpreter in the same state as this one, sharing
+        memory until written.  By default, the new interpreter uses the
+        same I/O as this one.  Any of the I/O arguments of the
+        constructor may be given to replace them.
+        """
+        other = copy.copy(self)
+        other.memory = self.memory.fork()
+        other.output_callback_params = list(self.output_callback_params)
+        other.input_buffer = deque(self.input_buffer)
+        other.output_buffer = None
+        other.text_output = list(self.text_output)
+        other.set_io(**kwargs)
+        return other
+
+    def set_io(self, **kwargs):
+        """
+        Replaces any of the I/O arguments given to the constructor.
+        """
+        unknown = set(kwargs) - set(io_args)
+        if unknown:
+            raise TypeError('Unknown I/O arguments: {}'.format(sorted(unknown)))
+
+        callback = kwargs.get('output_callback')
+        if callback is not None and kwargs.get('num_output_args') is None:
+            kwargs['num_output_args'] = num_callback_args(callback)
+
+        for name,value in kwargs.items():
+            setattr(self, name, value)
+
+    def iteration(self):
+        """
+        Executes a single instruction.  Slower than run(), but makes no
+        assumptions about which addresses have been reserved.
+        """
+        self.instr = self.memory.decode(self.ip)
+        opcode = self.instr.opcode
+        if opcode == 1:
+            self.op_add()
+        elif opcode == 2:
+            self.op_mul()
+        elif opcode == 3:
+            self.op_input()
+        elif opcode == 4:
+            self.op_output()
+        elif opcode == 5:
+            self.op_jump_if_true()
+        elif opcode == 6:
+            self.op_jump_if_false()
+        elif opcode == 7:
+            self.op_lt()
+        elif opcode == 8:
+            self.op_eq()
+        elif opcode == 9:
+            self.op_adjust_relative_base()
+
+        self.done = (opcode == 99)
+
+    def run(self, max_steps = None):
+        """
+        Executes instructions until the program halts, needs input that
+        is not available, or has executed max_steps instructions.
+        Returns HALTED, NEEDS_INPUT, or STEP_LIMIT accordingly.
+        """
+        if self.profiler is not None or self.tracer is not None:
+            return self.run_instrumented(max_steps)
+
+        memory = self.memory
+        if memory.shared:
+            memory.unshare()
+        data = memory.data
+        decoded = memory.decoded
+        decoded_addrs = memory.decoded_addrs
+        invalidate = memory.invalidate
+        read_input = self.read_input
+        write_output = self.write_output
+        recorder = self.recorder
+
+        ip = self.ip
+        rb = self.relative_base
+        steps = 0
+        stop_at = -1 if max_steps is None else max_steps
+        self.paused = False
+
+        try:
+            while True:
+                if steps == stop_at:
+                    return STEP_LIMIT
+
+                instr = memory.decode(ip)
+                if instr.opcode == 99:
+                    self.done = True
+                    return HALTED
+
+                rb_min, rb_max = memory.relative_base_range(rb)
+                if ip not in decoded or not (rb_min <= rb <= rb_max):
+                    # The instruction may touch memory that has not
+                    # been reserved, so let iteration() handle it.
+                    self.ip = ip
+                    self.relative_base = rb
+                    self.iteration()
+                    ip = self.ip
+                    rb = self.relative_base
+                    if self.paused:
+                        return NEEDS_INPUT
+                    steps += 1
+                    continue
+
+                try:
+                    while steps != stop_at:
+                        instr = decoded.get(ip)
+                        if instr is None:
+                            break
+
+                        handler, opcode, am, a, bm, b, cm, c, size = instr
+
+                        if handler is not None:
+                            c = handler(data, rb, a, b, c)
+                            if c in decoded_addrs:
+                                invalidate(c)
+                            ip += 4
+
+                        elif opcode == 5 or opcode == 6:
+                            if am == 0:
+                                a = data[a]
+                            elif am == 2:
+                                a = data[a+rb]
+                            if (opcode == 5) == (a != 0):
+                                if bm == 0:
+                                    b = data[b]
+                                elif bm == 2:
+                                    b = data[b+rb]
+                                ip = b
+                            else:
+                                ip += 3
+
+                        elif opcode == 9:
+                            if am == 0:
+                                a = data[a]
+                            elif am == 2:
+                                a = data[a+rb]
+                            rb += a
+                            ip += 2
+                            if not (rb_min <= rb <= rb_max):
+                                steps += 1
+                                break
+
+                        elif opcode == 3:
+                            x = read_input()
+                            if x is None:
+                                self.paused = True
+                                return NEEDS_INPUT
+                            if recorder is not None:
+                                recorder.record_input(self, x)
+                            if am == 2:
+                                a += rb
+                            memory[a] = x
+                            data = memory.data
+                            ip += 2
+
+                        elif opcode == 4:
+                            if am == 0:
+                                a = data[a]
+                            elif am == 2:
+                                a = data[a+rb]
+                            write_output(a)
+                            ip += 2
+
+                        else:
+                            break
+
+                        steps += 1
+
+                except OverflowError:
+                    # A result did not fit in 64 bits.  Nothing was
+                    # written, so switch to Python integers and retry.
+                    memory.promote()
+                    data = memory.data
+
+        finally:
+            self.ip = ip
+            self.relative_base = rb
+            self.steps += steps
+
+    def run_instrumented(self, max_steps = None):
+        """
+        Executes instructions one at a time through iteration(),
+        reporting each one to the profiler and tracer, if set.  Used by
+        run() while either is enabled, so that the fast loop has no
+        checks.  The tracer may be replaced or removed by a callback
+        during the run.
+        """
+        if self.memory.shared:
+            self.memory.unshare()
+
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start_run(self)
+
+        steps = 0
+        reason = STEP_LIMIT
+        self.paused = False
+        try:
+            while steps != max_steps:
+                ip = self.ip
+                instr = self.memory.decode(ip)
+                if instr.opcode == 99:
+                    self.done = True
+                    reason = HALTED
+                    break
+
+                tracer = self.tracer
+                if tracer is not None:
+                    self.instr = instr
+                    operands = self.operands()
+
+                start = time.perf_counter()
+                self.iteration()
+                if profiler is not None and instr.opcode == 3:
+                    profiler.input_wait += time.perf_counter() - start
+                if self.paused:
+                    reason = NEEDS_INPUT
+                    break
+
+                steps += 1
+                if profiler is not None:
+                    profiler.record(self, ip, instr)
+                if tracer is not None:
+                    tracer.record(ip, instr.opcode, operands,
+                                  self.written_value(instr, operands))
+
+        finally:
+            self.steps += steps
+            if profiler is not None:
+                profiler.end_run(self, reason)
+
+        return reason
+
+    def operands(self):
+        """
+        Returns the operands of the current instruction, before it is
+        executed.  Parameters that are read are given by value, and
+        the parameter written to is given by address.
+        """
+        instr = self.instr
+        output_param = output_params.get(instr.opcode)
+        operands = []
+        for i,(mode,val) in enumerate(instr.params, 1):
+            if i == output_param:
+                operands.append(val + self.relative_base if mode == 2 else val)
+            else:
+                operands.append(self.get_param(i))
+        return tuple(operands)
+
+    def written_value(self, instr, operands):
+        """
+        Returns the value written to memory or to the output by an
+        instruction that has just been executed, or None.
+        """
+        if instr.opcode == 4:
+            return operands[0]
+        elif instr.opcode in output_params:
+            return self.memory[operands[output_params[instr.opcode]-1]]
+        else:
+            return None
+
+    def get_param(self,i):
+        mode,val = self.instr.params[i-1]
+        if mode==0:
+            val = self.memory[val]
+        elif mode==2:
+            val = self.memory[val + self.relative_base]
+
+        return val
+
+    def set_param(self, i, val):
+        mode,addr = self.instr.params[i-1]
+        if mode==0:
+            self.memory[addr] = val
+        elif mode==1:
+            raise ValueError('Cannot use mode==1 (immediate mode) for output params')
+        elif mode==2:
+            self.memory[addr + self.relative_base] = val
+
+    def read_input(self):
+        """
+        Returns the next input value, or None if no input is available.
+        """
+        if self.input_callback is not None:
+            return self.input_callback()
+        elif self.input_iter is not None:
+            return next(self.input_iter)
+        elif self.input_queue is not None:
+            return self.input_queue.get()
+        elif self._input_val is not None:
+            x = self._input_val
+            self._input_val = None
+            return x
+        elif self.input_buffer:
+            return self.input_buffer.popleft()
+        else:
+            return None
+
+    def write_output(self, a):
+        self.output_val = a
+
+        if self.recorder is not None:
+            self.recorder.record_output(self, a)
+
+        if self.output_buffer is not None:
+            self.output_buffer.append(a)
+
+        if self.output_queue is not None:
+            self.output_queue.put(a)
+
+        if self.output_callback is not None:
+            if self.num_output_args == 1:
+                self.output_callback(a)
+            else:
+                self.output_callback_params.append(a)
+                if len(self.output_callback_params) == self.num_output_args:
+                    self.output_callback(*self.output_callback_params)
+                    self.output_callback_params.clear()
+
+
+    def op_add(self):
+        a = self.get_param(1)
+        b = self.get_param(2)
+
+        x = a+b
+        self.set_param(3, x)
+        self.ip += 4
+
+    def op_mul(self):
+        a = self.get_param(1)
+        b = self.get_param(2)
+
+        x = a*b
+        self.set_param(3, x)
+        self.ip += 4
+
+    def op_input(self):
+        x = self.read_input()
+        if x is None:
+            self.paused = True
+            return
+
+        if self.recorder is not None:
+            self.recorder.record_input(self, x)
+        self.set_param(1, x)
+        self.ip += 2
+
+    def op_output(self):
+        a = self.get_param(1)
+        self.write_output(a)
+        self.ip += 2
+
+
+    def op_jump_if_true(self):
+        a = self.get_param(1)
+        b = self.get_param(2)
+
+        if a:
+            self.ip = b
+        else:
+            self.ip += 3
+
+    def op_jump_if_false(self):
+        a = self.get_param(1)
+        b = self.get_param(2)
+
+        if not a:
+            self.ip = b
+        else:
+            self.ip += 3
+
+    def op_lt(self):
+        a = self.get_param(1)
+        b = self.get_param(2)
+
+        x = int(a<b)
+        self.set_param(3, x)
+        self.ip += 4
+
+    def op_eq(self):
+        a = self.get_param(1)
+        b = self.get_param(2)
+
+        x = int(a==b)
+        self.set_param(3, x)
+        self.ip += 4
+
+
+    def op_adjust_relative_base(self):
+        a = self.get_param(1)
+        self.relative_base += a
+        self.ip += 2
+
+
+    def feed(self, values):
+        """
+        Adds values to be read as input, in order.
+        """
+        self.input_buffer.extend(values)
+        self.paused = False
+
+    def run_until_blocked(self, max_steps = None):
+        """
+        Runs until the program halts or needs input that has not been
+        given, and returns a list of the values output.
+        """
+        outputs = []
+        prev_buffer = self.output_buffer
+        self.output_buffer = outputs
+        try:
+            if not self.done:
+                self.run(max_steps)
+        finally:
+            self.output_buffer = prev_buffer
+        return outputs
+
+    def stream(self, burst_steps = 10000):
+        """
+        Generator that runs the program, yielding each value output.
+        When the program needs input that has not been given, yields
+        NEEDS_INPUT instead.  A value passed to send() is given as
+        input, and send() returns the next value yielded.  Finishes
+        once the program halts.
+
+        The program runs at most burst_steps instructions between
+        yields, so a program that never blocks can still be consumed
+        lazily.
+        """
+        while not self.done:
+            for value in self.run_until_blocked(burst_steps):
+                sent = yield value
+                if sent is not None:
+                    self.feed([sent])
+
+            # Input may have arrived while the outputs were consumed,
+            # which also unpauses the interpreter.
+            while self.paused:
+                sent = yield NEEDS_INPUT
+                if sent is not None:
+                    self.feed([sent])
+
+    def send_text(self, text):
+        """
+        Gives each character of text as ASCII input, then runs until
+        blocked.  The output is kept for read_lines().
+        """
+        self.feed(text.encode('ascii'))
+        self.text_output.extend(self.run_until_blocked())
+
+    def read_lines(self):
+        """
+        Runs until blocked, then returns each complete line of output
+        since the last call, without the newline.  Any output that is
+        not ASCII is returned as an int, in place of a line.  A
+        partial line is kept for the next call.
+        """
+        output = self.text_output
+        output.extend(self.run_until_blocked())
+
+        end = len(output)
+        while end > 0 and output[end-1] != 10 and 0 <= output[end-1] < 128:
+            end -= 1
+        complete = output[:end]
+        self.text_output = output[end:]
+
+        if not complete:
+            return []
+        elif 0 <= min(complete) and max(complete) < 128:
+            return bytes(complete).decode('ascii').split('\n')[:-1]
+
+        lines = []
+        start = 0
+        for i,value in enumerate(complete):
+            if value == 10:
+                lines.append(bytes(complete[start:i]).decode('ascii'))
+                start = i+1
+            elif not 0 <= value < 128:
+                if i > start:
+                    lines.append(bytes(complete[start:i]).decode('ascii'))
+                lines.append(value)
+                start = i+1
+        return lines
+
+    def iterate_until_done(self, max_steps = None, deadline = None):
+        """
+        Runs until the program halts or needs input, for at most
+        max_steps instructions, and until time.monotonic() passes
+        deadline.  The deadline is checked every deadline_check_steps
+        instructions, between calls to run(), so that the run loops
+        have no extra checks.
+
+        Returns a RunResult, holding the reason for stopping, one of
+        HALTED, NEEDS_INPUT, STEP_LIMIT, or DEADLINE, and the number
+        of instructions executed.  An interpreter still waiting for
+        input returns at once, with none executed.
+        """
+        if self.done:
+            return RunResult(HALTED, 0)
+        if self.paused:
+            return RunResult(NEEDS_INPUT, 0)
+
+        start = self.steps
+        while True:
+            remaining = None if max_steps is None else start + max_steps - self.steps
+            if deadline is not None:
+                if time.monotonic() >= deadline:
+                    return RunResult(DEADLINE, self.steps - start)
+                if remaining is None or remaining > self.deadline_check_steps:
+                    remaining = self.deadline_check_steps
+
+            reason = self.run(remaining)
+            steps = self.steps - start
+            if reason != STEP_LIMIT or steps == max_steps or deadline is None:
+                return RunResult(reason, steps)
+
+
+class WarmStart:
+    """
+    A program that has been run up to its first input request.  New
+    sessions start from that state, rather than copying the program
+    and repeating its initialization.  Any output from before the
+    first input is replayed to each new session.
+
+    Sessions passed to release() are kept in a pool of up to
+    pool_size interpreters, to be reset and reused by acquire().  The
+    instructions they decoded, and any blocks they compiled, are kept
+    as well, so that later sessions need not decode or compile them
+    again.
+    """
+    def __init__(self, program, interpreter_class = Interpreter, pool_size = 0):
+        self.outputs = []
+        self.interp = interpreter_class(program, output_callback=self.outputs.append,
+                                        num_output_args=1)
+        self.interp.run()
+        self.interp.set_io(output_callback=None, num_output_args=None)
+
+        self.pool_size = pool_size
+        self.pool = []
+
+    def acquire(self, **kwargs):
+        """
+        Returns an interpreter in the starting state, using the I/O
+        arguments given.
+        """
+        if self.pool:
+            interp = self.pool.pop()
+            interp.restore(self.interp.snapshot())
+            io = {name: getattr(self.interp, name) for name in io_args}
+            io.update(kwargs)
+            interp.set_io(**io)
+        else:
+            interp = self.interp.fork(**kwargs)
+
+        for value in self.outputs:
+            interp.write_output(value)
+
+        return interp
+
+    def release(self, interp):
+        """
+        Returns an interpreter from acquire() to the pool.
+        """
+        self.learn(interp)
+        if len(self.pool) < self.pool_size:
+            self.pool.append(interp)
+
+    def learn(self, interp):
+        """
+        Adds the instructions decoded by a session to the starting
+        state, wherever the session has not modified them.  The
+        memory class decides what else is kept.
+        """
+        self.interp.memory.learn_from(interp.memory)
+
+
+def program_hash(program):
+    return hashlib.sha256(','.join(str(x) for x in program).encode()).hexdigest()
+
+warm_starts = {}
+
+def warm_start(program, interpreter_class = Interpreter):
+    """
+    Returns the WarmStart for the program, creating it the first time
+    the program is seen.
+    """
+    key = (interpreter_class, program_hash(program))
+    if key not in warm_starts:
+        warm_starts[key] = WarmStart(program, interpreter_class)
+    return warm_starts[key]
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+
+"""
+Ahead-of-time translation of Intcode programs into Python modules.
+
+The code reachable from the start of the program, and the parameters
+written at runtime, are found by intcode_disasm.  Each basic block is
+then translated into a Python function.  Where a block has a single
+predecessor, it is emitted inline within that predecessor, and jumps
+back to the start of a function become a while loop.
+
+The generated module is cached on disk, keyed by a hash of the
+program, and is loaded by AotInterpreter on later runs.  Anything the
+translation could not see ahead of time is handled by the
+block-compiling backend.  That includes jumps to computed addresses,
+and any write into the program's own code at runtime, which discards
+the translated code for that address.
+
+Usage: intcode_aot.py [puzzle ...]
+"""
+
+from collections import defaultdict
+import hashlib
+import importlib.util
+import os
+import sys
+
+import util
+from intcode_disasm import Program
+from intcode_jit import (Block, BlockInterpreter, BlockMemory,
+                         arithmetic_exprs, param_source, write_source)
+
+# Included in the hash of each program, so that cached translations
+# are regenerated whenever the translator changes.
+translator_version = 6
+
+default_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 '__intcode_cache__')
+
+loaded_modules = {}
+
+
+def program_hash(program):
+    text = '{}:{}'.format(translator_version, ','.join(str(x) for x in program))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class Translator:
+    def __init__(self, program):
+        # Reachability and volatile parameters come from the static
+        # analysis.  Return addresses are reached from the calls found
+        # there, although the jumps back to them are computed.
+        self.program = Program(program)
+        self.memory = BlockMemory(program)
+        self.memory.volatile.update(self.program.volatile)
+        self.find_leaders()
+
+    def decode(self, ip):
+        """
+        Returns the instruction at ip, or None if it is left to the
+        interpreter.
+        """
+        instr = self.program.instrs[ip]
+        if instr.opcode in (3, 99):
+            return None
+
+        try:
+            self.memory.decode(ip)
+        except (ValueError, IndexError):
+            return None
+
+        if ip not in self.memory.decoded:
+            return None
+
+        return instr
+
+    def static_param(self, ip, i, mode, value):
+        return self.program.static_param(ip, i, mode, value)
+
+    def find_leaders(self):
+        """
+        Finds the instructions to translate, the addresses at which
+        functions start, and the number of jumps or fall-throughs
+        leading to each address.
+        """
+        program = self.program
+        self.instrs = {}
+        self.leaders = {0} | set(program.blocks)
+        self.preds = defaultdict(int)
+
+        for ip in sorted(program.instrs):
+            instr = self.decode(ip)
+            if instr is None:
+                # Left to the interpreter, which then continues at any
+                # of its successors.
+                self.leaders.add(ip)
+                self.leaders.update(program.successors(ip))
+            else:
+                self.instrs[ip] = instr
+
+        for ip,instr in self.instrs.items():
+            next_ip = ip + instr.size
+            if ip in program.calls:
+                call = program.calls[ip]
+                dests = [] if call.target is None else [call.target]
+                self.preds[call.return_addr] += 1
+            else:
+                dests = program.successors(ip)
+
+            for dest in dests:
+                self.preds[dest] += 1
+
+            if instr.opcode == 4:
+                self.leaders.add(next_ip)
+            elif instr.opcode == 9 and self.static_param(ip, 1, instr.a_mode, instr.a) is None:
+                self.leaders.add(next_ip)
+
+    def function_source(self, entry):
+        """
+        Returns the source of the function for the block starting at
+        entry, along with its Block parameters and the ranges of
+        memory it was generated from.
+        """
+        self.body = []
+        self.exit_sizes = []
+        self.rel_offsets = []
+        self.ranges = []
+        self.loops = False
+
+        self.emit_block(entry, entry, 2, 0, 0, {entry})
+
+        size = max(self.exit_sizes)
+        rel_min = min(self.rel_offsets, default=0)
+        rel_max = max(self.rel_offsets, default=0)
+
+        lines = ['def block_{}(data, rb, memory, code_addrs, write_output, budget):'.format(entry),
+                 '    n = 0']
+        if self.loops:
+            lines.append('    while True:')
+            lines.append('        if n + {} > budget:'.format(size))
+            lines.append('            return {}, rb, n'.format(entry))
+            lines.extend(self.body)
+        else:
+            lines.extend(line[4:] for line in self.body)
+
+        return '\n'.join(lines), size, rel_min, rel_max, self.ranges
+
+    def emit_exit(self, dest_source, indent, k):
+        self.body.append('    '*indent + 'return {}, rb, n + {}'.format(dest_source, k))
+        self.exit_sizes.append(k)
+
+    def emit_transfer(self, entry, dest, dest_source, indent, k, delta, visited):
+        """
+        Emits a jump or fall-through to dest, after k instructions have
+        executed since the start of the function or loop.  dest is None
+        if the destination is only known at runtime.
+        """
+        if dest == entry and delta == 0:
+            self.loops = True
+            self.body.append('    '*indent + 'n += {}'.format(k))
+            self.body.append('    '*indent + 'continue')
+            self.exit_sizes.append(k)
+        elif (dest in self.instrs and dest not in visited and
+              self.preds[dest] == 1):
+            self.emit_block(entry, dest, indent, k, delta, visited | {dest})
+        else:
+            self.emit_exit(dest_source, indent, k)
+
+    def emit_block(self, entry, start, indent, k, delta, visited):
+        pad = '    '*indent
+        ip = start
+        while True:
+            if ip != start and ip in self.leaders:
+                self.emit_transfer(entry, ip, str(ip), indent, k, delta, visited)
+                return
+
+            instr = self.instrs.get(ip)
+            if instr is None:
+                self.emit_exit(str(ip), indent, k)
+                return
+
+            self.ranges.append((ip, ip+instr.size))
+            params = [(ip, i+1, mode, value)
+                      for i,(mode,value) in enumerate(instr.params)]
+            sources = [param_source(self.memory, *param) for param in params]
+            self.rel_offsets.extend(delta+value for _,i,mode,value in params
+                                    if mode == 2 and ip+i not in self.memory.volatile)
+            next_ip = ip + instr.size
+            opcode = instr.opcode
+            k += 1
+
+            if opcode in arithmetic_exprs:
+                expr = arithmetic_exprs[opcode].format(a=sources[0], b=sources[1])
+                exit_source = 'return {}, rb, n + {}'.format(next_ip, k)
+                self.body.extend(write_source(self.memory, *params[2], expr,
+                                              exit_source, indent))
+                self.exit_sizes.append(k)
+
+            elif opcode == 4:
+                self.body.append(pad + 'write_output({})'.format(sources[0]))
+                self.emit_exit(str(next_ip), indent, k)
+                return
+
+            elif opcode == 9:
+                self.body.append(pad + 'rb += {}'.format(sources[0]))
+                step = self.static_param(*params[0])
+                if step is None:
+                    self.emit_exit(str(next_ip), indent, k)
+                    return
+                delta += step
+
+            elif opcode == 5 or opcode == 6:
+                cond = self.static_param(*params[0])
+                target = self.static_param(*params[1])
+                cond_source, target_source = sources
+                if ip+2 in self.memory.volatile:
+                    # Read as the plain interpreter does, even if the
+                    # jump is not taken.
+                    self.body.append(pad + 'cond = {}'.format(cond_source))
+                    self.body.append(pad + 'target = {}'.format(target_source))
+                    cond_source, target_source = 'cond', 'target'
+                if cond is None:
+                    if opcode == 6:
+                        cond_source = 'not ' + cond_source
+                    self.body.append(pad + 'if {}:'.format(cond_source))
+                    self.emit_transfer(entry, target, target_source, indent+1,
+                                       k, delta, visited)
+                    self.emit_transfer(entry, next_ip, str(next_ip), indent,
+                                       k, delta, visited)
+                    return
+                elif (opcode == 5) == (cond != 0):
+                    self.emit_transfer(entry, target, target_source, indent,
+                                       k, delta, visited)
+                    return
+
+            ip = next_ip
+
+    def module_source(self):
+        lines = ['"""',
+                 'Intcode program translated by intcode_aot.py.  Do not edit.',
+                 '"""',
+                 '',
+                 'reserve = {}'.format(len(self.memory.data)),
+                 'volatile = {}'.format(sorted(self.memory.volatile)),
+                 '']
+
+        entries = []
+        for entry in sorted(self.leaders):
+            if entry not in self.instrs:
+                continue
+            source, size, rel_min, rel_max, ranges = self.function_source(entry)
+            lines.append(source)
+            lines.append('')
+            entries.append('    {}: (block_{}, {}, {}, {}, {}),'.format(
+                entry, entry, size, rel_min, rel_max, ranges))
+
+        lines.append('blocks = {')
+        lines.extend(entries)
+        lines.append('}')
+        lines.append('')
+        return '\n'.join(lines)
+
+
+def translate(program):
+    """
+    Returns the source of a Python module implementing the program.
+    """
+    return Translator(program).module_source()
+
+
+def cache_path(program, cache_dir = None):
+    if cache_dir is None:
+        cache_dir = default_cache_dir
+    return os.path.join(cache_dir,
+                        'intcode_{}.py'.format(program_hash(program)))
+
+
+def load(program, cache_dir = None):
+    """
+    Returns the translated module for the program, translating it and
+    writing it to the cache if needed.
+    """
+    path = cache_path(program, cache_dir)
+    if path in loaded_modules:
+        return loaded_modules[path]
+
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(translate(program))
+        os.replace(tmp_path, path)
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    loaded_modules[path] = module
+    return module
+
+
+class AotInterpreter(BlockInterpreter):
+    """
+    Interpreter that starts out with the translated blocks of the
+    program, and compiles any other blocks as they are reached.
+    """
+    def __init__(self, memory, *args, cache_dir = None, **kwargs):
+        super().__init__(memory, *args, **kwargs)
+
+        module = load(memory, cache_dir)
+        self.memory.reserve(module.reserve)
+        self.memory.volatile.update(module.volatile)
+        for start,(func, size, rel_min, rel_max, ranges) in module.blocks.items():
+            # Decoding the instructions of each block lets a write to
+            # their parameters mark them as volatile, rather than only
+            # discarding the block.
+            for begin,end in ranges:
+                self.memory.decode(begin)
+            self.memory.add_block(start, Block(func, size, rel_min, rel_max),
+                                  ranges)
+
+
+def main():
+    for puzzle in sys.argv[1:]:
+        memory = [int(x.strip()) for x in
+                  util.get_puzzle_input(puzzle).split(',')]
+        load(memory)
+        print(puzzle, cache_path(memory))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+A small assembler for Intcode.
+
+Each line holds an optional label, followed by an instruction or a
+directive, with anything after a ';' ignored.  Instructions use the
+names of intcode.opcode_names, with operands written as in
+intcode_disasm:
+
+    123        immediate
+    [123]      position
+    [rb+3]     relative, also [rb-3] or [rb]
+
+In place of a number, a label may be used, optionally with an offset
+such as `table+2`.  In immediate mode, the label gives its address.
+In position mode, it gives the location at that address.
+
+Directives are `.data` followed by values or labels, separated by
+commas, and `.zero n`, which reserves n locations set to 0.
+
+For example,
+
+    loop:  add  [counter], 1, [counter]
+           lt   [counter], 10, [flag]
+           jnz  [flag], loop
+           out  [counter]
+           halt
+    counter: .data 0
+    flag:    .data 0
+"""
+
+from intcode import instruction_sizes, opcode_names, output_params
+
+opcodes = {name: opcode for opcode,name in opcode_names.items()}
+
+
+class AssemblyError(ValueError):
+    pass
+
+
+def split_label(line):
+    if ':' in line:
+        label, rest = line.split(':', 1)
+        label = label.strip()
+        if label.isidentifier():
+            return label, rest.strip()
+    return None, line
+
+
+def parse_value(text, labels):
+    """
+    Returns the value of a number, a label, or a label plus or minus a
+    number.
+    """
+    text = text.replace(' ', '')
+    try:
+        return int(text)
+    except ValueError:
+        pass
+
+    for sign in '+-':
+        if sign in text[1:]:
+            name, offset = text[1:].split(sign, 1)
+            name = text[0] + name
+            offset = int(offset) if sign == '+' else -int(offset)
+            break
+    else:
+        name, offset = text, 0
+
+    if name not in labels:
+        raise AssemblyError('Unknown label: {}'.format(name))
+    return labels[name] + offset
+
+
+def parse_operand(text, labels):
+    """
+    Returns the mode and value of an operand.
+    """
+    text = text.strip()
+    if text.startswith('[') and text.endswith(']'):
+        inner = text[1:-1].strip()
+        if inner == 'rb':
+            return 2, 0
+        if inner.startswith('rb') and inner[2:].strip()[:1] in ('+', '-'):
+            return 2, int(inner[2:].replace(' ', ''))
+        return 0, parse_value(inner, labels)
+
+    return 1, parse_value(text, labels)
+
+
+def parse_lines(source):
+    """
+    Yields the line number, label, and statement of each line, where
+    either may be None.
+    """
+    for line_num,line in enumerate(source.splitlines(), 1):
+        line = line.split(';', 1)[0].strip()
+        label, statement = split_label(line)
+        yield line_num, label, statement or None
+
+
+def statement_size(statement):
+    name, _, args = statement.partition(' ')
+    if name == '.data':
+        return len(args.split(','))
+    elif name == '.zero':
+        return int(args)
+    elif name in opcodes:
+        return instruction_sizes[opcodes[name]]
+    raise AssemblyError('Unknown instruction: {}'.format(name))
+
+
+def assemble(source):
+    """
+    Returns the program given by the assembly source, as a list of
+    integers.
+    """
+    # First pass, to find the address of each label.
+    labels = {}
+    addr = 0
+    for line_num,label,statement in parse_lines(source):
+        try:
+            if label is not None:
+                if label in labels:
+                    raise AssemblyError('Duplicate label: {}'.format(label))
+                labels[label] = addr
+            if statement is not None:
+                addr += statement_size(statement)
+        except ValueError as e:
+            raise AssemblyError('Line {}: {}'.format(line_num, e)) from None
+
+    program = []
+    for line_num,label,statement in parse_lines(source):
+        if statement is None:
+            continue
+        try:
+            program.extend(assemble_statement(statement, labels))
+        except ValueError as e:
+            raise AssemblyError('Line {}: {}'.format(line_num, e)) from None
+
+    return program
+
+
+def assemble_statement(statement, labels):
+    name, _, args = statement.partition(' ')
+    args = [arg for arg in args.split(',') if arg.strip()]
+
+    if name == '.data':
+        return [parse_value(arg, labels) for arg in args]
+    elif name == '.zero':
+        return [0]*int(args[0])
+
+    opcode = opcodes[name]
+    size = instruction_sizes[opcode]
+    if len(args) != size-1:
+        raise AssemblyError('{} takes {} operands, not {}'.format(
+            name, size-1, len(args)))
+
+    value = opcode
+    params = []
+    for i,arg in enumerate(args, 1):
+        mode, param = parse_operand(arg, labels)
+        if mode == 1 and i == output_params.get(opcode):
+            raise AssemblyError('Cannot write to an immediate operand')
+        value += mode * 10**(i+1)
+        params.append(param)
+
+    return [value] + params
@@ -0,0 +1,54 @@
+"""
+Intcode interpreter for use with asyncio.
+
+Input and output go through asyncio.Queue channels.  The interpreter
+runs without yielding until it needs input that has not arrived, then
+awaits its input channel.  Many interpreters can then share one event
+loop, with no threads and no locks.
+"""
+
+import asyncio
+
+from intcode import HALTED, Interpreter
+
+
+class AsyncInterpreter(Interpreter):
+    """
+    Interpreter that reads from input_channel once any other input
+    source is exhausted, and writes each output to output_channel, if
+    given.  Chains are made by using one interpreter's input_channel
+    as another's output_channel.
+    """
+    def __init__(self, memory, *args, input_channel = None,
+                 output_channel = None, **kwargs):
+        super().__init__(memory, *args, **kwargs)
+        self.input_channel = asyncio.Queue() if input_channel is None else input_channel
+        self.output_channel = output_channel
+        self.channel_reads = 0
+
+    def read_input(self):
+        x = super().read_input()
+        if x is None and not self.input_channel.empty():
+            x = self.input_channel.get_nowait()
+            self.channel_reads += 1
+        return x
+
+    def write_output(self, a):
+        super().write_output(a)
+        if self.output_channel is not None:
+            self.output_channel.put_nowait(a)
+
+    async def wait_for_input(self):
+        """
+        Waits until a value arrives on the input channel, then gives it
+        to the interpreter.
+        """
+        self.input_val = await self.input_channel.get()
+        self.channel_reads += 1
+
+    async def run_async(self):
+        """
+        Runs until the program halts, waiting for input as needed.
+        """
+        while self.run() != HALTED:
+            await self.wait_for_input()
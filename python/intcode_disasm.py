@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+
+"""
+Static analysis of Intcode programs.
+
+The code is found by following every jump from address 0 whose target
+is known ahead of time.  A jump is a call if the instruction before it
+pushes the address following the jump onto the stack, with a
+relative-mode write, as the programs in puzzle_inputs do.  Calls are
+assumed to return to that address.  An unconditional jump to a
+relative-mode target that is not a call is a return.  Any other jump
+to a computed address is listed, but not followed.
+
+From this, the program is split into basic blocks and functions, and
+memory is split into code, data that is never written, data written
+through position-mode parameters, and the stack that lies above the
+initial relative base.
+
+Usage: intcode_disasm.py puzzle [summary | profile.json]
+
+Prints the disassembly of the named puzzle's program, or a summary of
+its functions and memory regions.  Given a JSON file written by
+intcode_profile.py, each instruction and function is annotated with
+the number of times it was executed.
+"""
+
+from collections import namedtuple
+import json
+import sys
+
+import util
+from intcode import decode_instruction, opcode_names, output_params
+
+Call = namedtuple('Call', ['ip', 'target', 'return_addr'])
+Call.__doc__ = """
+A call made by the jump at ip.  target is None if the address called
+is computed at runtime.
+"""
+
+BasicBlock = namedtuple('BasicBlock', ['start', 'end', 'successors'])
+BasicBlock.__doc__ = """
+The instructions from start up to, but not including, end.
+successors are the addresses of the blocks that may run next, with a
+call leading to its return address.
+"""
+
+
+class Function:
+    """
+    The instructions reachable from the entry of a function without
+    following calls or returns.
+    """
+    def __init__(self, entry):
+        self.entry = entry
+        self.instrs = set()
+        self.calls = []
+        self.returns = set()
+        self.global_reads = set()
+        self.global_writes = set()
+        self.has_io = False
+        self.computed_reads = False
+        self.computed_writes = False
+
+    @property
+    def callees(self):
+        return {call.target for call in self.calls}
+
+
+class Program:
+    def __init__(self, program, entries = ()):
+        self.program = list(program)
+
+        # Writes to constant addresses inside the parameters of
+        # reachable instructions make those parameters volatile.
+        # Volatile parameters can hide jump targets, so repeat until
+        # no new volatile parameters are found.
+        self.volatile = set()
+        while True:
+            self.discover([0] + list(entries))
+            volatile = self.code_writes()
+            if volatile <= self.volatile:
+                break
+            self.volatile.update(volatile)
+
+        self.blocks = self.find_blocks()
+        self.functions = self.find_functions()
+
+    def decode(self, ip):
+        if not self.in_program(ip):
+            return None
+        try:
+            instr = decode_instruction(self.program, ip)
+        except (ValueError, IndexError):
+            return None
+
+        return instr
+
+    def in_program(self, addr):
+        return 0 <= addr < len(self.program)
+
+    def static_param(self, ip, i, mode, value):
+        """
+        Returns the value of an immediate-mode parameter that is not
+        changed at runtime, or None.
+        """
+        if mode == 1 and ip+i not in self.volatile:
+            return value
+        return None
+
+    def pushes_return(self, ip, return_addr):
+        """
+        Returns True if the instruction before the jump at ip writes
+        return_addr to the stack.
+        """
+        prev_ip = ip - 4
+        instr = self.instrs.get(prev_ip) or self.decode(prev_ip)
+        if instr is None or instr.size != 4 or instr.c_mode != 2:
+            return False
+
+        a = self.static_param(prev_ip, 1, instr.a_mode, instr.a)
+        b = self.static_param(prev_ip, 2, instr.b_mode, instr.b)
+        if a is None or b is None:
+            return False
+
+        if instr.opcode == 1:
+            return a + b == return_addr
+        elif instr.opcode == 2:
+            return a * b == return_addr
+        return False
+
+    def discover(self, entries):
+        """
+        Finds the instructions reachable from the entries, along with
+        the jump targets, calls, returns, and jumps to computed
+        addresses.
+        """
+        self.instrs = {}
+        self.invalid = set()
+        self.jump_targets = set()
+        self.calls = {}
+        self.returns = set()
+        self.computed_jumps = set()
+
+        seen = set(entries)
+        to_visit = list(entries)
+
+        def visit(addr):
+            if addr not in seen:
+                seen.add(addr)
+                to_visit.append(addr)
+
+        while to_visit:
+            ip = to_visit.pop()
+            instr = self.decode(ip)
+            if instr is None:
+                self.invalid.add(ip)
+                continue
+
+            self.instrs[ip] = instr
+            next_ip = ip + instr.size
+            opcode = instr.opcode
+
+            if opcode == 99:
+                continue
+
+            elif opcode == 5 or opcode == 6:
+                cond = self.static_param(ip, 1, instr.a_mode, instr.a)
+                target = self.static_param(ip, 2, instr.b_mode, instr.b)
+                always = cond is not None and (opcode == 5) == (cond != 0)
+                never = cond is not None and not always
+
+                if always and self.pushes_return(ip, next_ip):
+                    self.calls[ip] = Call(ip, target, next_ip)
+                    visit(next_ip)
+                elif always and target is None and instr.b_mode == 2:
+                    self.returns.add(ip)
+                elif target is None and not never:
+                    self.computed_jumps.add(ip)
+
+                # A jump outside of the program leaves the code that
+                # can be analysed, and fails when it is reached.
+                if target is not None and not never and self.in_program(target):
+                    self.jump_targets.add(target)
+                    visit(target)
+                if not always:
+                    visit(next_ip)
+
+            else:
+                visit(next_ip)
+
+    def code_writes(self):
+        """
+        Returns the parameters of reachable instructions that are
+        written through position-mode parameters.
+        """
+        param_slots = set()
+        for ip,instr in self.instrs.items():
+            param_slots.update(range(ip+1, ip+instr.size))
+
+        return {addr for addr in self.global_writes() if addr in param_slots}
+
+    def global_writes(self):
+        writes = set()
+        for ip,instr in self.instrs.items():
+            i = output_params.get(instr.opcode)
+            if i is None:
+                continue
+            mode,value = instr.params[i-1]
+            if mode == 0 and ip+i not in self.volatile:
+                writes.add(value)
+        return writes
+
+    def is_jump(self, ip):
+        return self.instrs[ip].opcode in (5, 6, 99)
+
+    def successors(self, ip):
+        """
+        Returns the addresses that may execute after the instruction at
+        ip.  A call leads to its return address.
+        """
+        instr = self.instrs[ip]
+        next_ip = ip + instr.size
+        if instr.opcode == 99 or ip in self.returns:
+            return []
+
+        if ip in self.calls:
+            return [next_ip]
+
+        if instr.opcode == 5 or instr.opcode == 6:
+            cond = self.static_param(ip, 1, instr.a_mode, instr.a)
+            target = self.static_param(ip, 2, instr.b_mode, instr.b)
+            always = cond is not None and (instr.opcode == 5) == (cond != 0)
+            never = cond is not None and not always
+            output = []
+            if target is not None and not never and self.in_program(target):
+                output.append(target)
+            if not always:
+                output.append(next_ip)
+            return output
+
+        return [next_ip]
+
+    def find_blocks(self):
+        """
+        Returns the basic blocks, keyed by start address.
+        """
+        leaders = {0} | self.jump_targets
+        leaders.update(call.return_addr for call in self.calls.values())
+        for ip,instr in self.instrs.items():
+            if self.is_jump(ip):
+                leaders.add(ip + instr.size)
+
+        blocks = {}
+        for start in sorted(leaders):
+            if start not in self.instrs:
+                continue
+
+            ip = start
+            while True:
+                instr = self.instrs[ip]
+                next_ip = ip + instr.size
+                if (self.is_jump(ip) or next_ip in leaders or
+                    next_ip not in self.instrs):
+                    break
+                ip = next_ip
+
+            blocks[start] = BasicBlock(start, next_ip, self.successors(ip))
+
+        return blocks
+
+    def find_functions(self):
+        """
+        Returns the functions, keyed by entry address.  The code
+        reached from address 0 is treated as a function as well.
+        """
+        entries = {0}
+        entries.update(call.target for call in self.calls.values()
+                       if call.target is not None)
+
+        functions = {}
+        for entry in sorted(entries):
+            if entry not in self.instrs:
+                continue
+
+            func = Function(entry)
+            to_visit = [entry]
+            while to_visit:
+                ip = to_visit.pop()
+                if ip in func.instrs or ip not in self.instrs:
+                    continue
+                func.instrs.add(ip)
+                self.add_effects(func, ip)
+                to_visit.extend(self.successors(ip))
+
+            functions[entry] = func
+
+        return functions
+
+    def add_effects(self, func, ip):
+        instr = self.instrs[ip]
+        opcode = instr.opcode
+        if opcode == 3 or opcode == 4:
+            func.has_io = True
+        if ip in self.calls:
+            func.calls.append(self.calls[ip])
+        if ip in self.returns:
+            func.returns.add(ip)
+
+        output_param = output_params.get(opcode)
+        for i,(mode,value) in enumerate(instr.params, 1):
+            if ip+i in self.volatile and mode != 1:
+                # The address is only known at runtime.
+                if i == output_param:
+                    func.computed_writes = True
+                else:
+                    func.computed_reads = True
+            elif mode == 0:
+                if i == output_param:
+                    func.global_writes.add(value)
+                else:
+                    func.global_reads.add(value)
+
+    def code_addrs(self):
+        addrs = set()
+        for ip,instr in self.instrs.items():
+            addrs.update(range(ip, ip+instr.size))
+        return addrs
+
+    def stack_base(self):
+        """
+        Returns the initial relative base set by the first instruction,
+        or None.
+        """
+        instr = self.instrs.get(0)
+        if instr is not None and instr.opcode == 9:
+            return self.static_param(0, 1, instr.a_mode, instr.a)
+        return None
+
+    def regions(self):
+        """
+        Returns the memory regions of the program as (start, end, kind)
+        tuples.  kind is 'code', 'written code', 'data', 'written data',
+        or 'stack'.  The stack has no end.
+        """
+        code = self.code_addrs()
+        written = self.global_writes()
+
+        def kind(addr):
+            if addr in code:
+                return 'written code' if addr in written else 'code'
+            return 'written data' if addr in written else 'data'
+
+        regions = []
+        for addr in range(len(self.program)):
+            k = kind(addr)
+            if regions and regions[-1][2] == k:
+                regions[-1][1] = addr+1
+            else:
+                regions.append([addr, addr+1, k])
+
+        # Writes beyond the end of the program, not on the stack.
+        stack_base = self.stack_base()
+        for addr in sorted(written):
+            if addr < len(self.program):
+                continue
+            if stack_base is not None and addr >= stack_base:
+                continue
+            if regions[-1][2] == 'written data' and regions[-1][1] == addr:
+                regions[-1][1] = addr+1
+            else:
+                regions.append([addr, addr+1, 'written data'])
+
+        if stack_base is not None:
+            regions.append([stack_base, None, 'stack'])
+
+        return [tuple(region) for region in regions]
+
+    def function_counts(self, ip_counts):
+        """
+        Returns the number of instructions executed within each
+        function, given the number executed at each address.
+        """
+        return {entry: sum(ip_counts.get(ip, 0) for ip in func.instrs)
+                for entry,func in self.functions.items()}
+
+    def format_instr(self, ip):
+        instr = self.instrs[ip]
+        output_param = output_params.get(instr.opcode)
+        operands = []
+        for i,(mode,value) in enumerate(instr.params, 1):
+            if mode == 0:
+                text = '[{}]'.format(value)
+            elif mode == 1:
+                text = str(value)
+            else:
+                text = '[rb{:+d}]'.format(value)
+            if ip+i in self.volatile:
+                text += '?'
+            operands.append(text)
+
+        text = '{:4s} {}'.format(opcode_names[instr.opcode], ', '.join(operands))
+        if ip in self.calls:
+            target = self.calls[ip].target
+            text = '{:32s} ; call {}'.format(
+                text, 'computed' if target is None else target)
+        elif ip in self.returns:
+            text = '{:32s} ; return'.format(text)
+        elif ip in self.computed_jumps:
+            text = '{:32s} ; computed jump'.format(text)
+        return text
+
+    def disassembly(self, ip_counts = None):
+        """
+        Returns the disassembly as text.  Parameters that are written
+        at runtime are marked with a '?'.  If ip_counts is given, the
+        number of times each instruction was executed is shown.
+        """
+        lines = []
+        data = []
+
+        def flush_data():
+            for i in range(0, len(data), 8):
+                values = data[i:i+8]
+                lines.append('{:6d}  {}.data {}'.format(
+                    values[0][0], ' '*count_width,
+                    ', '.join(str(value) for addr,value in values)))
+            data.clear()
+
+        count_width = 0 if ip_counts is None else 11
+
+        ip = 0
+        while ip < len(self.program):
+            if ip not in self.instrs:
+                data.append((ip, self.program[ip]))
+                ip += 1
+                continue
+
+            flush_data()
+            if ip in self.functions:
+                lines.append('')
+                lines.append('function {}:'.format(ip))
+            elif ip in self.blocks:
+                lines.append('')
+
+            count = ''
+            if ip_counts is not None:
+                count = '{:10d} '.format(ip_counts.get(ip, 0))
+            lines.append('{:6d}  {}{}'.format(ip, count, self.format_instr(ip)))
+            ip += self.instrs[ip].size
+
+        flush_data()
+        return '\n'.join(lines)
+
+    def summary(self, ip_counts = None):
+        lines = ['Instructions:   {}'.format(len(self.instrs)),
+                 'Basic blocks:   {}'.format(len(self.blocks)),
+                 'Functions:      {}'.format(len(self.functions)),
+                 'Calls:          {} ({} computed)'.format(
+                     len(self.calls),
+                     sum(1 for call in self.calls.values() if call.target is None)),
+                 'Returns:        {}'.format(len(self.returns)),
+                 'Computed jumps: {}'.format(len(self.computed_jumps)),
+                 '',
+                 'Memory regions:']
+        for start,end,kind in self.regions():
+            if end is None:
+                lines.append('  {:6d}-       {}'.format(start, kind))
+            else:
+                lines.append('  {:6d}-{:<6d} {}'.format(start, end-1, kind))
+
+        lines.append('')
+        lines.append('Functions:')
+        counts = None if ip_counts is None else self.function_counts(ip_counts)
+        for entry,func in sorted(self.functions.items()):
+            notes = []
+            if func.has_io:
+                notes.append('I/O')
+            if func.global_writes or func.computed_writes:
+                notes.append('writes globals')
+            if func.global_reads or func.computed_reads:
+                notes.append('reads globals')
+            if func.callees:
+                notes.append('calls {}'.format(', '.join(
+                    'computed' if target is None else str(target)
+                    for target in sorted(func.callees, key=lambda t: -1 if t is None else t))))
+            line = '  {:6d} {:4d} instrs'.format(entry, len(func.instrs))
+            if counts is not None:
+                line += ' {:10d} executed'.format(counts[entry])
+            lines.append('{}  {}'.format(line, '; '.join(notes)))
+
+        return '\n'.join(lines)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    puzzle = sys.argv[1]
+    memory = [int(x.strip()) for x in
+              util.get_puzzle_input(puzzle).split(',')]
+    program = Program(memory)
+
+    args = sys.argv[2:]
+    ip_counts = None
+    if args and args[0] != 'summary':
+        with open(args[0]) as f:
+            ip_counts = {int(ip): count for ip,count in
+                         json.load(f)['ip_counts'].items()}
+
+    if args[:1] == ['summary']:
+        print(program.summary())
+    else:
+        print(program.disassembly(ip_counts))
+        if ip_counts is not None:
+            print()
+            print(program.summary(ip_counts))
+
+if __name__ == '__main__':
+    main()
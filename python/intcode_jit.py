@@ -0,0 +1,581 @@
+"""
+Block-compiling backend for the Intcode interpreter.
+
+The program is split into basic blocks, each of which is translated
+into Python source and compiled into a function the first time it is
+executed.  A compiled block runs its instructions straight through,
+without decoding them again.
+
+A block ends at any jump, at any output, at the entry point of any
+known jump target, and before any input or halt instruction.  Input
+and halt are left to the plain interpreter.  A write into the memory
+of a compiled block discards that block, so self-modifying programs
+still behave correctly.  If the write was to the parameters of an
+instruction, the recompiled block reads those parameters from memory
+rather than using constants, so that programs that modify their own
+parameters don't need to be recompiled after every write.
+
+A block that loops back to itself, stepping a counter towards a limit
+and adding constants to other locations, is a counting loop.  Its
+compiled block computes the number of passes and the final values
+directly, and only runs the loop itself if that isn't safe, such as
+when a location it writes is code.
+"""
+
+from collections import namedtuple
+import functools
+import sys
+
+from intcode import (Interpreter, Memory, STEP_LIMIT,
+                     max_instruction_size, max_reserved_size)
+
+Block = namedtuple('Block', ['func', 'size', 'rel_min', 'rel_max'])
+Block.__doc__ = """
+A compiled block.  size is the largest number of instructions the
+block executes before returning, or before checking its step budget.
+rel_min and rel_max give the range of relative-mode offsets used
+within the block, measured from the relative base on entry.
+
+The function is called as func(data, rb, memory, code_addrs,
+write_output, budget), and returns the new instruction pointer, the
+new relative base, and the number of instructions executed.
+"""
+
+arithmetic_exprs = {1: '{a} + {b}',
+                    2: '{a} * {b}',
+                    7: 'int({a} < {b})',
+                    8: 'int({a} == {b})'}
+
+
+def param_source(memory, ip, i, mode, value):
+    """
+    Returns the source to read parameter i of the instruction at ip.
+    Parameters that the program has overwritten at runtime are read
+    from memory each time, rather than compiled in as constants.
+    """
+    if ip+i in memory.volatile:
+        slot = 'data[{}]'.format(ip+i)
+        if mode == 0:
+            return 'memory[{}]'.format(slot)
+        elif mode == 1:
+            return slot
+        else:
+            return 'memory[rb+{}]'.format(slot)
+
+    if mode == 0:
+        return 'data[{}]'.format(value)
+    elif mode == 1:
+        return str(value)
+    else:
+        return 'data[rb{:+d}]'.format(value)
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_source(source):
+    """
+    Compiles the source of a block.  Cached by source, so that
+    interpreters running the same program share compiled blocks.
+    """
+    namespace = {}
+    exec(source, namespace)
+    return namespace['block']
+
+
+def write_source(memory, ip, i, mode, value, expr, exit_source, indent=1):
+    """
+    Returns the lines to write expr to parameter i of the instruction at
+    ip.  If the write lands in code, exit_source is used to leave the
+    block, since the code that follows may have changed.
+    """
+    pad = '    '*indent
+    slot = ip+i
+    lines = []
+    if slot in memory.volatile:
+        if mode == 0:
+            lines.append(pad + 'addr = data[{}]'.format(slot))
+        else:
+            lines.append(pad + 'addr = rb + data[{}]'.format(slot))
+        lines.append(pad + 'memory[addr] = {}'.format(expr))
+        lines.append(pad + 'if addr in code_addrs:')
+    elif mode == 0 and value in memory.volatile:
+        # Blocks that read the parameter from memory can continue
+        # after the write, unless the location is also compiled into
+        # some block, such as the opcode of an overlapping instruction.
+        lines.append(pad + 'data[{}] = {}'.format(value, expr))
+        lines.append(pad + 'if {} in memory.blocks_at:'.format(value))
+        lines.append(pad + '    memory.invalidate({})'.format(value))
+        lines.append(pad + '    ' + exit_source)
+        lines.append(pad + 'memory.invalidate({})'.format(value))
+        return lines
+    else:
+        if mode == 0:
+            addr = str(value)
+        else:
+            lines.append(pad + 'addr = rb{:+d}'.format(value))
+            addr = 'addr'
+        lines.append(pad + 'data[{}] = {}'.format(addr, expr))
+        lines.append(pad + 'if {} in code_addrs:'.format(addr))
+        lines.append(pad + '    memory.invalidate({})'.format(addr))
+    lines.append(pad + '    ' + exit_source)
+    return lines
+
+
+def loop_iterations(x, step, limit, op):
+    """
+    Returns the number of times a loop runs, where each pass adds step
+    to x and then continues while `x op limit` holds.  Returns None if
+    the loop never ends.
+    """
+    if op == '>':
+        x, step, limit, op = -x, -step, -limit, '<'
+    elif op == '>=':
+        x, step, limit, op = -x, -step, -limit, '<='
+    if op == '<=':
+        limit, op = limit+1, '<'
+
+    x += step
+    if op == '<':
+        if not x < limit:
+            return 1
+        elif step <= 0:
+            return None
+        return 1 + (limit - x + step - 1)//step
+
+    elif op == '==':
+        if x != limit:
+            return 1
+        elif step == 0:
+            return None
+        return 2
+
+    else:
+        if x == limit:
+            return 1
+        elif step == 0 or (limit - x) % step != 0 or (limit - x)//step < 0:
+            return None
+        return 1 + (limit - x)//step
+
+
+class CountingLoop:
+    """
+    A block that jumps back to its own start, made only of additions
+    of loop-invariant values to memory, followed by a comparison of one
+    of those locations against a loop-invariant value, and a jump on
+    the result.  Such loops implement multiplication, division, and
+    the like, and are run in a single step using the closed form.
+
+    Each slot is a (mode, value) parameter in position or relative
+    mode.  Each operand may also be in immediate mode.  updates are
+    (slot, operand) pairs, adding the operand to the slot.  The loop
+    continues while `counter op limit` holds.
+    """
+
+    # Operators for which the comparison written to the flag is the
+    # condition to continue, rather than its negation.
+    flag_ops = ('<', '>', '==')
+
+    def __init__(self, start, end, size, updates, counter, op, limit, flag):
+        self.start = start
+        self.end = end
+        self.size = size
+        self.updates = updates
+        self.counter = counter
+        self.op = op
+        self.limit = limit
+        self.flag = flag
+
+    def run(self, data, rb, code_addrs, budget):
+        """
+        Runs as many passes of the loop as fit in the budget, and
+        returns the new instruction pointer and the number of
+        instructions executed.  Returns None if the loop can't be
+        summarized, such as when it would write to code.
+        """
+        def addr(slot):
+            mode,value = slot
+            return value if mode == 0 else rb + value
+
+        def read(operand):
+            mode,value = operand
+            if mode == 1:
+                return value
+            return data[addr(operand)]
+
+        written = [addr(slot) for slot,_ in self.updates]
+        written.append(addr(self.flag))
+        read_addrs = [addr(operand) for _,operand in self.updates
+                      if operand[0] != 1]
+        if self.limit[0] != 1:
+            read_addrs.append(addr(self.limit))
+        if (len(set(written)) != len(written) or
+            not set(written).isdisjoint(read_addrs) or
+            not code_addrs.isdisjoint(written)):
+            return None
+
+        values = [data[a] for a in written[:-1]]
+        steps = [read(operand) for _,operand in self.updates]
+        limit = read(self.limit)
+        if not all(type(x) is int for x in values + steps + [limit]):
+            return None
+
+        i = [slot for slot,_ in self.updates].index(self.counter)
+        n = loop_iterations(values[i], steps[i], limit, self.op)
+        if n is None:
+            return None
+
+        n = min(n, budget // self.size)
+        for a,x,step in zip(written, values, steps):
+            data[a] = x + n*step
+
+        x = values[i] + n*steps[i]
+        cont = {'<': x < limit, '<=': x <= limit, '>': x > limit,
+                '>=': x >= limit, '==': x == limit, '!=': x != limit}[self.op]
+        compare_result = cont if self.op in self.flag_ops else not cont
+        data[written[-1]] = int(compare_result)
+
+        ip = self.start if cont else self.end
+        return ip, n*self.size
+
+
+def find_counting_loop(memory, start, end):
+    """
+    Returns a CountingLoop for the block from start to end, or None if
+    the block is not a counting loop.
+    """
+    instrs = []
+    ip = start
+    while ip < end:
+        instr = memory.decoded.get(ip)
+        if instr is None:
+            return None
+        if any(ip+i in memory.volatile for i in range(instr.size)):
+            return None
+        instrs.append(instr)
+        ip += instr.size
+
+    if len(instrs) < 3:
+        return None
+    *adds, compare, jump = instrs
+
+    if jump.opcode not in (5, 6) or (jump.b_mode, jump.b) != (1, start):
+        return None
+    if compare.opcode not in (7, 8) or any(instr.opcode != 1 for instr in adds):
+        return None
+
+    updates = []
+    for instr in adds:
+        a, b, c = instr.params
+        if a == c:
+            updates.append((c, b))
+        elif b == c:
+            updates.append((c, a))
+        else:
+            return None
+
+    flag = compare.params[2]
+    written = [slot for slot,_ in updates] + [flag]
+    operands = [operand for _,operand in updates]
+    if len(set(written)) != len(written) or jump.params[0] != flag:
+        return None
+    if any(operand in written for operand in operands):
+        return None
+    if any(mode == 0 and start <= value < end for mode,value in written):
+        return None
+
+    a, b = compare.params[:2]
+    if a in written and a != flag and b not in written:
+        counter, limit = a, b
+        op = '<' if compare.opcode == 7 else '=='
+    elif b in written and b != flag and a not in written:
+        counter, limit = b, a
+        op = '>' if compare.opcode == 7 else '=='
+    else:
+        return None
+
+    # Jump-if-false continues while the comparison fails.
+    if jump.opcode == 6:
+        op = {'<': '>=', '>': '<=', '==': '!='}[op]
+
+    return CountingLoop(start, end, len(instrs), tuple(updates), counter, op,
+                        limit, flag)
+
+
+def block_source(memory, start):
+    """
+    Generates the source of the block starting at start.  Returns the
+    source, along with the number of instructions, the range of
+    relative-mode offsets used, and the (begin, end) range of each
+    instruction in the block.
+    """
+    lines = ['def block(data, rb, memory, code_addrs, write_output, budget):']
+    rel_offsets = []
+    ranges = []
+    delta = 0
+    ip = start
+    size = 0
+
+    while True:
+        try:
+            instr = memory.decode(ip)
+        except (ValueError, IndexError):
+            # Decoding past the start of the block is speculative,
+            # as earlier instructions may overwrite what follows.
+            if ip == start:
+                raise
+            break
+
+        if ip not in memory.decoded or instr.opcode in (3, 99):
+            break
+        if ip != start and ip in memory.jump_targets:
+            break
+
+        params = [(ip, i+1, mode, value)
+                  for i,(mode,value) in enumerate(instr.params)]
+        sources = [param_source(memory, *param) for param in params]
+        rel_offsets.extend(delta+value for _,i,mode,value in params
+                           if mode == 2 and ip+i not in memory.volatile)
+        next_ip = ip + instr.size
+        ranges.append((ip, next_ip))
+        size += 1
+        opcode = instr.opcode
+
+        if opcode in arithmetic_exprs:
+            expr = arithmetic_exprs[opcode].format(a=sources[0], b=sources[1])
+            exit_source = 'return {}, rb, {}'.format(next_ip, size)
+            lines.extend(write_source(memory, *params[2], expr, exit_source))
+
+        elif opcode == 4:
+            lines.append('    write_output({})'.format(sources[0]))
+            ip = next_ip
+            break
+
+        elif opcode == 9:
+            lines.append('    rb += {}'.format(sources[0]))
+            if sources[0] != str(instr.a):
+                # The change to the relative base is not known, so
+                # later offsets can't be checked on entry.
+                ip = next_ip
+                break
+            delta += instr.a
+
+        elif opcode == 5 or opcode == 6:
+            cond = sources[0]
+            target = sources[1]
+            if ip+2 in memory.volatile:
+                # The plain interpreter reads the target even when the
+                # jump is not taken, and raises if its address is
+                # negative, so read it before testing the condition.
+                lines.append('    cond = {}'.format(cond))
+                lines.append('    target = {}'.format(target))
+                cond, target = 'cond', 'target'
+            if opcode == 6:
+                cond = 'not ' + cond
+            lines.append('    if {}:'.format(cond))
+            lines.append('        return {}, rb, {}'.format(target, size))
+            if sources[1] == str(instr.b):
+                memory.jump_targets.add(instr.b)
+            ip = next_ip
+            break
+
+        ip = next_ip
+
+    lines.append('    return {}, rb, {}'.format(ip, size))
+
+    loop = None
+    if memory.summarize_loops and start in memory.jump_targets:
+        loop = find_counting_loop(memory, start, ip)
+    if loop is not None:
+        # The loop itself is run by the compiled block only when it
+        # can't be summarized.
+        args = [loop.start, loop.end, loop.size, loop.updates, loop.counter,
+                loop.op, loop.limit, loop.flag]
+        lines[1:1] = ['    result = loop.run(data, rb, code_addrs, budget)',
+                      '    if result is not None:',
+                      '        return result[0], rb, result[1]']
+        lines[:0] = ['from intcode_jit import CountingLoop',
+                     'loop = CountingLoop({})'.format(', '.join(repr(arg) for arg in args))]
+
+    rel_min = min(rel_offsets, default=0)
+    rel_max = max(rel_offsets, default=0)
+    return '\n'.join(lines), size, rel_min, rel_max, ranges
+
+
+class BlockMemory(Memory):
+    """
+    Memory that also caches compiled blocks, discarding a block
+    whenever the memory it was compiled from is written.
+    """
+    def __init__(self, values):
+        super().__init__(values)
+        self.blocks = {}
+        self.blocks_at = {}
+        self.block_ranges = {}
+        self.jump_targets = set()
+        self.volatile = set()
+
+    # Counting loops are run in a single step when True.
+    summarize_loops = True
+
+    def make_dense(self, values):
+        # Compiled blocks write to self.data directly, with no check
+        # for values that would not fit in 64 bits.
+        return list(values)
+
+    def unshare(self):
+        super().unshare()
+        self.blocks = dict(self.blocks)
+        self.blocks_at = {addr: set(starts)
+                          for addr,starts in self.blocks_at.items()}
+        self.block_ranges = dict(self.block_ranges)
+        self.jump_targets = set(self.jump_targets)
+        self.volatile = set(self.volatile)
+
+    def compile_block(self, start):
+        source, size, rel_min, rel_max, ranges = block_source(self, start)
+        if size == 0:
+            func = None
+            ranges = [(start, start + self.decode(start).size)]
+        else:
+            func = compile_source(source)
+
+        block = Block(func, size, rel_min, rel_max)
+        self.add_block(start, block, ranges)
+        return block
+
+    def add_block(self, start, block, ranges):
+        """
+        Adds a block starting at start, compiled from the instruction
+        in each (begin, end) range given.  The block reads volatile
+        parameters from memory, so only a write to its opcodes or to
+        its other parameters discards it.
+        """
+        self.blocks[start] = block
+        self.block_ranges[start] = ranges
+        for begin,end in ranges:
+            for addr in range(begin, end):
+                if addr == begin or addr not in self.volatile:
+                    self.blocks_at.setdefault(addr, set()).add(start)
+            self.decoded_addrs.update(range(begin, end))
+
+    def learn_from(self, other):
+        """
+        Also adds the blocks compiled by other, wherever the memory
+        they were compiled from is unmodified.  Parameters written by
+        other stay volatile here, as its blocks read them from memory.
+        """
+        super().learn_from(other)
+
+        new = []
+        for start,block in other.blocks.items():
+            if start in self.blocks:
+                continue
+            ranges = other.block_ranges[start]
+            if all(self.unmodified(other, (addr for addr in range(begin, end)
+                                           if addr not in other.volatile))
+                   for begin,end in ranges):
+                new.append((start, block, ranges))
+
+        if not (new or other.jump_targets - self.jump_targets or
+                other.volatile - self.volatile):
+            return
+
+        if self.shared:
+            self.unshare()
+        self.jump_targets.update(other.jump_targets)
+        self.volatile.update(other.volatile)
+        # Compiled blocks index self.data directly, for any address
+        # they were compiled to use.
+        self.reserve(len(other.data))
+        for start,block,ranges in new:
+            self.add_block(start, block, ranges)
+
+    def invalidate(self, addr):
+        # A write to the parameters of an instruction, rather than to
+        # the opcode, marks those parameters as volatile.  Blocks are
+        # then recompiled to read them from memory.
+        for ip in range(addr-max_instruction_size+1, addr):
+            instr = self.decoded.get(ip)
+            if instr is not None and addr < ip+instr.size:
+                self.volatile.add(addr)
+
+        super().invalidate(addr)
+        for start in self.blocks_at.pop(addr, ()):
+            self.blocks.pop(start, None)
+
+
+class BlockInterpreter(Interpreter):
+    """
+    Interpreter that executes compiled blocks where possible, falling
+    back to the plain interpreter for input, halting, and any block
+    that does not fit in the remaining step budget.
+    """
+    memory_class = BlockMemory
+
+    # If set by a subclass, called as before_block(ip, rb, steps,
+    # stop_at) before each block is looked up.  Returns the ip and
+    # step count to continue from.
+    before_block = None
+
+    def run(self, max_steps = None):
+        if self.profiler is not None or self.tracer is not None:
+            return self.run_instrumented(max_steps)
+
+        memory = self.memory
+        if memory.shared:
+            memory.unshare()
+        data = memory.data
+        blocks = memory.blocks
+        compile_block = memory.compile_block
+        code_addrs = memory.decoded_addrs
+        write_output = self.write_output
+        before_block = self.before_block
+
+        stop_at = sys.maxsize if max_steps is None else self.steps + max_steps
+        self.paused = False
+
+        ip = self.ip
+        rb = self.relative_base
+        steps = self.steps
+        try:
+            while True:
+                if before_block is not None:
+                    ip, steps = before_block(ip, rb, steps, stop_at)
+
+                if steps >= stop_at:
+                    return STEP_LIMIT
+
+                block = blocks.get(ip)
+                if block is None:
+                    block = compile_block(ip)
+
+                if (block.func is not None and
+                    steps + block.size <= stop_at and
+                    rb + block.rel_min >= 0):
+
+                    if rb + block.rel_max >= len(data):
+                        needed = rb + block.rel_max + 1
+                        if needed > max_reserved_size:
+                            block = None
+                        else:
+                            memory.reserve(needed)
+
+                    if block is not None:
+                        ip, rb, n = block.func(data, rb, memory, code_addrs,
+                                               write_output, stop_at - steps)
+                        steps += n
+                        continue
+
+                self.ip = ip
+                self.relative_base = rb
+                self.steps = steps
+                reason = Interpreter.run(self, 1)
+                ip = self.ip
+                rb = self.relative_base
+                steps = self.steps
+                if reason != STEP_LIMIT:
+                    return reason
+
+        finally:
+            self.ip = ip
+            self.relative_base = rb
+            self.steps = steps
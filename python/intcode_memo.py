@@ -0,0 +1,408 @@
+"""
+Memoization of pure Intcode subroutines.
+
+A function found by intcode_disasm is pure if its only effects are on
+the stack above the relative base it is called with, where the caller
+has pushed the return address, followed by the arguments.  Within a
+pure function, no relative-mode access lies below that.  Any
+position-mode read is of a constant, or of a scratch location that is
+always written earlier in the same basic block, wherever it is read.
+A pure function performs no I/O, makes no calls to computed
+addresses, and calls only pure functions.  Its code is never written.
+
+The result of a call is then determined by the stack locations read
+before they are written.  Those values are the key into a bounded LRU
+cache.  The cache holds the final values of every location written,
+and the number of instructions executed.  A repeated call writes
+those values and jumps straight to the return address.
+
+A function's own calls are summarized by their keys, and by the
+locations whose values they determine: those written on every path,
+and the arguments.  Writes made into the frame of a callee, such as
+its arguments, are not results unless every path makes them.  After
+a call, only the locations the callee determines are known above its
+relative base, and a function that reads anything else there is not
+memoized.  Like the programs in puzzle_inputs, callers outside of
+the functions memoized are assumed to read back only the locations
+a call determines.
+
+If a program can write to computed addresses, nothing is memoized.
+If execution reaches code the analysis did not see, memoization is
+switched off for that program.
+"""
+
+from collections import OrderedDict, namedtuple
+
+from intcode import output_params, program_hash
+from intcode_disasm import Program
+from intcode_jit import BlockInterpreter
+
+PureFunction = namedtuple('PureFunction', ['entry', 'args', 'results', 'known'])
+PureFunction.__doc__ = """
+A pure function.  args, results and known are offsets from the
+relative base on entry.  args are the stack locations that make up the
+key, and results those written.  known are the locations whose values
+on return are determined by the key: those written on every path, and
+the arguments.
+"""
+
+Pending = namedtuple('Pending', ['key', 'return_addr', 'rb', 'steps'])
+
+# Passes over the functions of a program before giving up on finding
+# a consistent summary of each.
+max_passes = 100
+
+
+def frame_offsets(program, func):
+    """
+    Returns the offset of the relative base from its value on entry,
+    for each instruction of the function, or None if that is not fixed.
+    """
+    offsets = {func.entry: 0}
+    to_visit = [func.entry]
+    while to_visit:
+        ip = to_visit.pop()
+        instr = program.instrs[ip]
+        offset = offsets[ip]
+        if instr.opcode == 9:
+            step = program.static_param(ip, 1, instr.a_mode, instr.a)
+            if step is None:
+                return None
+            offset += step
+
+        for succ in program.successors(ip):
+            if succ not in func.instrs:
+                continue
+            if succ not in offsets:
+                offsets[succ] = offset
+                to_visit.append(succ)
+            elif offsets[succ] != offset:
+                return None
+
+    return offsets
+
+
+def scratch_globals(program):
+    """
+    Returns the locations written by position mode that are always
+    written before being read within the same basic block.
+    """
+    candidates = program.global_writes()
+    for block in program.blocks.values():
+        written = set()
+        ip = block.start
+        while ip < block.end:
+            instr = program.instrs[ip]
+            output_param = output_params.get(instr.opcode)
+            for i,(mode,value) in enumerate(instr.params, 1):
+                if mode == 0 and i != output_param and value not in written:
+                    candidates.discard(value)
+            if output_param is not None:
+                mode,value = instr.params[output_param-1]
+                if mode == 0:
+                    written.add(value)
+            ip += instr.size
+
+    return candidates
+
+
+def computed_writes(program):
+    for ip,instr in program.instrs.items():
+        i = output_params.get(instr.opcode)
+        if i is not None and ip+i in program.volatile:
+            return True
+    return False
+
+
+def merge_known(a, b):
+    """
+    Returns the stack locations known on both paths, where None
+    stands for every location.
+    """
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a & b
+
+
+def lowest_base(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+def analyze_function(program, func, scratch, written, summaries):
+    """
+    Returns a PureFunction, or None if the function may not be pure.
+    summaries holds the PureFunction of each function that may be
+    called, or None for one not yet analyzed.
+    """
+    if func.has_io or func.computed_reads or func.computed_writes:
+        return None
+    if any(call.target is None or call.target not in summaries
+           for call in func.calls):
+        return None
+    if not func.instrs.isdisjoint(program.computed_jumps):
+        return None
+    if not (func.global_writes <= scratch):
+        return None
+    if any(addr in written and addr not in scratch for addr in func.global_reads):
+        return None
+
+    code = set()
+    for ip in func.instrs:
+        code.update(range(ip, ip + program.instrs[ip].size))
+    if not code.isdisjoint(written):
+        return None
+
+    prologue = program.instrs[func.entry]
+    frame_size = None
+    if prologue.opcode == 9:
+        frame_size = program.static_param(func.entry, 1, prologue.a_mode, prologue.a)
+    if frame_size is None or frame_size <= 0:
+        return None
+
+    offsets = frame_offsets(program, func)
+    if offsets is None:
+        return None
+
+    # Locations at or above the relative base of a call lie in the
+    # frame of the callee.
+    callee_base = min((offsets[ip] for ip in func.instrs if ip in program.calls),
+                      default=None)
+
+    # For each instruction, the stack locations whose values are known
+    # from the arguments, with None standing for every location, and
+    # the lowest relative base of any call made on the way there.
+    # Above that base, only the results of the call are known.
+    states = {func.entry: (frozenset(), None)}
+    to_visit = [func.entry]
+    args = set()
+    writes = set()
+    must_write = []
+    while to_visit:
+        ip = to_visit.pop()
+        instr = program.instrs[ip]
+        base = offsets[ip]
+        known, clobbered = states[ip]
+
+        if ip in program.returns:
+            if base != 0 or instr.b != 0:
+                return None
+            must_write.append(known)
+            continue
+
+        output_param = output_params.get(instr.opcode)
+        new_known = set(known) if known is not None else None
+        for i,(mode,value) in enumerate(instr.params, 1):
+            if mode != 2:
+                continue
+            offset = base + value
+            if offset <= 0:
+                return None
+            if i == output_param:
+                writes.add(offset)
+                if new_known is not None:
+                    new_known.add(offset)
+            elif known is not None and offset not in known:
+                if clobbered is not None and offset > clobbered:
+                    return None
+                args.add(offset)
+
+        if ip in program.calls:
+            callee = summaries[program.calls[ip].target]
+            clobbered = lowest_base(clobbered, base)
+            if callee is None:
+                new_known = None
+            else:
+                if new_known is not None:
+                    if any(base+offset not in new_known for offset in callee.args):
+                        return None
+                else:
+                    new_known = set(range(1, base+1))
+                new_known = {offset for offset in new_known if offset <= base}
+                new_known.update(base+offset for offset in callee.known)
+
+        state = (frozenset(new_known) if new_known is not None else None, clobbered)
+        for succ in program.successors(ip):
+            if succ not in func.instrs:
+                continue
+            if succ not in states:
+                states[succ] = state
+                to_visit.append(succ)
+                continue
+
+            prev_known, prev_clobbered = states[succ]
+            merged = (merge_known(prev_known, state[0]),
+                      lowest_base(prev_clobbered, clobbered))
+            if merged != states[succ]:
+                states[succ] = merged
+                to_visit.append(succ)
+
+    must = None
+    for known in must_write:
+        must = merge_known(must, known)
+    if must is None:
+        must = frozenset(writes)
+
+    # Writes into the frames of callees are not results, unless every
+    # path makes them.
+    results = {offset for offset in writes
+               if callee_base is None or offset < callee_base}
+    results.update(must)
+    known = must | args
+
+    return PureFunction(func.entry, tuple(sorted(args)), tuple(sorted(results)),
+                        tuple(sorted(known)))
+
+
+def pure_functions(program):
+    """
+    Returns the pure functions of an intcode_disasm.Program, keyed by
+    entry address.
+    """
+    if computed_writes(program):
+        return {}
+
+    scratch = scratch_globals(program)
+    written = program.global_writes()
+
+    # Each function's summary depends on those of the functions it
+    # calls, so repeat until none change.  A function that is not
+    # pure is removed, along with, in turn, every function calling it.
+    summaries = {entry: None for entry in program.functions if entry != 0}
+    for _ in range(max_passes):
+        changed = False
+        for entry in list(summaries):
+            if entry not in summaries:
+                continue
+            pure = analyze_function(program, program.functions[entry], scratch,
+                                    written, summaries)
+            if pure is None:
+                del summaries[entry]
+                changed = True
+            elif pure != summaries[entry]:
+                summaries[entry] = pure
+                changed = True
+
+        if not changed:
+            return summaries
+
+    return {}
+
+
+class Memo:
+    """
+    The pure functions of a program, and a cache of their results.
+    """
+    def __init__(self, program, cache_size = 4096):
+        self.program = Program(program)
+        self.functions = pure_functions(self.program)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def disable(self):
+        self.enabled = False
+        self.cache.clear()
+
+
+# Shared by every interpreter running the same program.
+memos = {}
+
+def memo_for(program):
+    key = program_hash(program)
+    memo = memos.get(key)
+    if memo is None:
+        memo = memos[key] = Memo(program)
+    return memo
+
+
+class MemoInterpreter(BlockInterpreter):
+    """
+    Block-compiling interpreter that skips calls to pure functions
+    whose result is already known.  Set memoize to False to run as a
+    plain BlockInterpreter.
+    """
+    memoize = True
+
+    def __init__(self, memory, *args, **kwargs):
+        super().__init__(memory, *args, **kwargs)
+        self.memo = memo_for(memory)
+        self.pending = []
+
+    def restore(self, snapshot):
+        super().restore(snapshot)
+        self.pending = []
+
+    def fork(self, **kwargs):
+        other = super().fork(**kwargs)
+        other.pending = list(self.pending)
+        return other
+
+    @property
+    def before_block(self):
+        if self.memoize and self.memo.enabled and self.memo.functions:
+            return self.skip_known_calls
+        return None
+
+    def skip_known_calls(self, ip, rb, steps, stop_at):
+        """
+        Records the result of a call returning at ip, and skips any
+        call at ip whose result is already known.
+        """
+        memory = self.memory
+        memo = self.memo
+        functions = memo.functions
+        pending = self.pending
+
+        while True:
+            if pending and ip == pending[-1].return_addr and rb == pending[-1].rb:
+                call = pending.pop()
+                func = functions[call.key[0]]
+                values = tuple(memory[rb+offset] for offset in func.results)
+                memo.put(call.key, (values, steps - call.steps))
+
+            if ip not in memory.blocks and ip not in memo.program.instrs:
+                memo.disable()
+                pending.clear()
+
+            if ip not in functions or not memo.enabled:
+                return ip, steps
+
+            func = functions[ip]
+            key = (ip,) + tuple(memory[rb+offset] for offset in func.args)
+            result = memo.get(key)
+            if result is None or steps + result[1] > stop_at:
+                break
+
+            memo.hits += 1
+            values, n = result
+            for offset,value in zip(func.results, values):
+                memory[rb+offset] = value
+            ip = memory[rb]
+            steps += n
+
+        # Unless the run stopped here before, on the way in.
+        memo.misses += 1
+        return_addr = memory[rb]
+        if not (pending and pending[-1].rb == rb and
+                pending[-1].return_addr == return_addr):
+            pending.append(Pending(key, return_addr, rb, steps))
+        return ip, steps
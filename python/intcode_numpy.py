@@ -0,0 +1,200 @@
+"""
+Lockstep execution of many copies of one Intcode program with NumPy.
+
+The memories of all instances are held as the rows of a 2-D int64
+array.  At each step, the running instances are grouped by their
+instruction pointer and the value stored there, and each group
+executes that instruction together.  Instances that take different
+branches end up in different groups, so diverging control flow is
+handled correctly, and is only slower.
+
+Input is given up front as one row of values per instance.  An
+instance that needs more input than it was given pauses, the same way
+Interpreter does without input_val.  Values are limited to 64 bits,
+and an OverflowError is raised if a result does not fit.
+"""
+
+import numpy as np
+
+from intcode import decode_opcode, max_reserved_size
+
+
+class BatchInterpreter:
+    def __init__(self, memories, inputs = None):
+        self.memory = np.array(memories, dtype=np.int64, ndmin=2)
+        num = len(self.memory)
+
+        if inputs is None:
+            inputs = np.zeros((num,0))
+        self.inputs = np.array(inputs, dtype=np.int64, ndmin=2)
+        if len(self.inputs) != num:
+            raise ValueError('Expected {} rows of inputs, found {}'.format(
+                num, len(self.inputs)))
+        self.input_pos = np.zeros(num, dtype=np.int64)
+
+        self.ip = np.zeros(num, dtype=np.int64)
+        self.relative_base = np.zeros(num, dtype=np.int64)
+        self.done = np.zeros(num, dtype=bool)
+        self.paused = np.zeros(num, dtype=bool)
+        self.steps = np.zeros(num, dtype=np.int64)
+
+        self.output_val = np.zeros(num, dtype=np.int64)
+        self.num_outputs = np.zeros(num, dtype=np.int64)
+        self.output_chunks = []
+
+    @classmethod
+    def from_program(cls, program, num, inputs = None):
+        """
+        Returns a batch of num copies of the program.
+        """
+        return cls(np.tile(np.array(program, dtype=np.int64), (num,1)),
+                   inputs)
+
+    def __len__(self):
+        return len(self.memory)
+
+    @property
+    def outputs(self):
+        """
+        A list of the values output by each instance.
+        """
+        output = [[] for _ in range(len(self))]
+        for lanes,values in self.output_chunks:
+            for lane,value in zip(lanes.tolist(), values.tolist()):
+                output[lane].append(value)
+        return output
+
+    def reserve(self, size):
+        width = self.memory.shape[1]
+        if size > width:
+            if size > max_reserved_size:
+                raise IndexError('Memory pos {} too large for batch execution'.format(size-1))
+            new_width = min(max(size, 2*width), max_reserved_size)
+            self.memory = np.pad(self.memory, ((0,0), (0,new_width-width)))
+
+    def run(self):
+        """
+        Executes every instance until it halts or needs input that is
+        not available.
+        """
+        while True:
+            lanes = np.flatnonzero(~(self.done | self.paused))
+            if len(lanes) == 0:
+                return
+
+            ips = self.ip[lanes]
+            if ips.min() < 0:
+                raise IndexError('Negative memory pos {} not allowed.'.format(ips.min()))
+            self.reserve(int(ips.max()) + 4)
+            words = self.memory[lanes, ips]
+
+            if (ips == ips[0]).all() and (words == words[0]).all():
+                self.execute(lanes, int(ips[0]), int(words[0]))
+                continue
+
+            # Grouping by ip alone is much faster than by (ip, word)
+            # pairs, and instances at the same ip rarely differ.
+            ip_keys, ip_groups = np.unique(ips, return_inverse=True)
+            for i,ip in enumerate(ip_keys.tolist()):
+                in_group = ip_groups == i
+                group = lanes[in_group]
+                group_words = words[in_group]
+                if (group_words == group_words[0]).all():
+                    self.execute(group, ip, int(group_words[0]))
+                    continue
+
+                word_keys, word_groups = np.unique(group_words, return_inverse=True)
+                for j,word in enumerate(word_keys.tolist()):
+                    self.execute(group[word_groups == j], ip, word)
+
+    def addresses(self, lanes, mode, value):
+        # Grows self.memory if needed, so must be called before
+        # self.memory is indexed.
+        if mode == 2:
+            value = value + self.relative_base[lanes]
+        if len(value) == 0:
+            return value
+        if value.min() < 0:
+            raise IndexError('Negative memory pos {} not allowed.'.format(value.min()))
+        self.reserve(int(value.max()) + 1)
+        return value
+
+    def param(self, lanes, mode, value):
+        if mode == 1:
+            return value
+        addrs = self.addresses(lanes, mode, value)
+        return self.memory[lanes, addrs]
+
+    def execute(self, lanes, ip, word):
+        """
+        Executes the instruction at ip, made up of the value word
+        followed by its parameters, in each of the lanes given.
+        """
+        handler, opcode, size, modes = decode_opcode(word)
+        if opcode == 99:
+            self.done[lanes] = True
+            return
+
+        self.steps[lanes] += 1
+
+        raw = self.memory[lanes, ip+1:ip+size]
+        params = [raw[:,i] for i in range(size-1)]
+
+        if opcode in (1, 2, 7, 8):
+            a = self.param(lanes, modes[0], params[0])
+            b = self.param(lanes, modes[1], params[1])
+            if opcode == 1:
+                result = a + b
+                if (((a ^ result) & (b ^ result)) < 0).any():
+                    raise OverflowError('Intcode addition exceeded 64 bits')
+            elif opcode == 2:
+                result = a * b
+                nonzero = a != 0
+                if (result[nonzero] // a[nonzero] != b[nonzero]).any():
+                    raise OverflowError('Intcode multiplication exceeded 64 bits')
+            elif opcode == 7:
+                result = (a < b).astype(np.int64)
+            else:
+                result = (a == b).astype(np.int64)
+            addrs = self.addresses(lanes, modes[2], params[2])
+            self.memory[lanes, addrs] = result
+            self.ip[lanes] += 4
+
+        elif opcode == 3:
+            available = self.input_pos[lanes] < self.inputs.shape[1]
+            self.paused[lanes[~available]] = True
+            self.steps[lanes[~available]] -= 1
+
+            lanes = lanes[available]
+            addrs = self.addresses(lanes, modes[0], params[0][available])
+            self.memory[lanes, addrs] = self.inputs[lanes, self.input_pos[lanes]]
+            self.input_pos[lanes] += 1
+            self.ip[lanes] += 2
+
+        elif opcode == 4:
+            a = self.param(lanes, modes[0], params[0])
+            self.output_val[lanes] = a
+            self.num_outputs[lanes] += 1
+            self.output_chunks.append((lanes, a))
+            self.ip[lanes] += 2
+
+        elif opcode == 5 or opcode == 6:
+            a = self.param(lanes, modes[0], params[0])
+            b = self.param(lanes, modes[1], params[1])
+            jump = (a != 0) if opcode == 5 else (a == 0)
+            self.ip[lanes] = np.where(jump, b, ip+3)
+
+        elif opcode == 9:
+            self.relative_base[lanes] += self.param(lanes, modes[0], params[0])
+            self.ip[lanes] += 2
+
+
+def run_batch(program, inputs):
+    """
+    Runs one copy of the program for each row of inputs, and returns
+    the BatchInterpreter once every copy has halted or paused.
+    """
+    inputs = np.array(inputs, dtype=np.int64, ndmin=2)
+    batch = BatchInterpreter.from_program(program, len(inputs), inputs)
+    batch.run()
+    return batch
@@ -0,0 +1,100 @@
+"""
+Runs one Intcode program on many independent sets of inputs, spread
+across a pool of worker processes.
+
+The program is sent to each worker once, when the worker starts.
+Input sets are then sent in chunks, and results are returned in the
+same order as the input sets.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import os
+
+from intcode import WarmStart
+
+
+def run_outputs(warm, inputs):
+    """
+    Gives each of the inputs to the program, and returns a tuple of
+    every value output.
+    """
+    outputs = []
+    interp = warm.acquire(output_callback=outputs.append, num_output_args=1)
+    for value in inputs:
+        interp.input_val = value
+        interp.iterate_until_done()
+    warm.release(interp)
+    return tuple(outputs)
+
+
+# Set in each worker process by init_worker().
+worker_program = None
+worker_func = None
+
+def init_worker(program, func):
+    global worker_program, worker_func
+    if func is None:
+        worker_program = WarmStart(program, pool_size=1)
+        worker_func = run_outputs
+    else:
+        worker_program = program
+        worker_func = func
+
+def run_chunk(chunk):
+    return [worker_func(worker_program, inputs) for inputs in chunk]
+
+
+def sweep(program, input_sets, workers = None, func = None, target = None,
+          chunk_size = 64):
+    """
+    Returns the result for each of the input sets.
+
+    By default, the result is the tuple of values output when the
+    program is given that set of inputs.  Otherwise, it is the return
+    value of func(program, inputs), which must be a module-level
+    function so that it can be sent to the workers.
+
+    If target is given, stops once a result equal to it is found.
+    The results up to and including that one are returned.
+
+    The input sets are read lazily, with at most two chunks per worker
+    in flight at a time.  With workers=1, everything runs in this
+    process.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    input_sets = iter(input_sets)
+    chunks = iter(lambda: list(itertools.islice(input_sets, chunk_size)), [])
+
+    results = []
+    def add_results(chunk_results):
+        for result in chunk_results:
+            results.append(result)
+            if target is not None and result == target:
+                return True
+        return False
+
+    if workers == 1:
+        init_worker(program, func)
+        for chunk in chunks:
+            if add_results(run_chunk(chunk)):
+                break
+        return results
+
+    with ProcessPoolExecutor(workers, initializer=init_worker,
+                             initargs=(program, func)) as pool:
+        pending = [pool.submit(run_chunk, chunk)
+                   for chunk in itertools.islice(chunks, 2*workers)]
+        while pending:
+            found = add_results(pending.pop(0).result())
+            if found:
+                pool.shutdown(cancel_futures=True)
+                break
+
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append(pool.submit(run_chunk, chunk))
+
+    return results
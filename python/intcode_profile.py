@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+"""
+Opt-in profiling of Intcode programs.
+
+While an interpreter has a Profiler, every instruction it executes is
+counted by opcode and by address.  The time spent waiting for input
+and the largest size reached by memory are recorded as well.
+
+Usage: intcode_profile.py puzzle [json_path]
+
+Runs the named day, for example d25, with a single profiler shared by
+every interpreter, then prints the hot-spot report.  If json_path is
+given, the profile is also written there as JSON.
+"""
+
+from collections import Counter
+import json
+import os
+import runpy
+import sys
+import time
+
+from intcode import Interpreter, NEEDS_INPUT, opcode_names
+
+
+class Profiler:
+    def __init__(self):
+        self.opcode_counts = Counter()
+        self.ip_counts = Counter()
+        self.input_wait = 0.0
+        self.memory_high_water = 0
+        self.run_time = 0.0
+
+        self.run_started = None
+        self.paused_at = {}
+
+    def start_run(self, interp):
+        self.run_started = time.perf_counter()
+
+        # Time between needing input and being run again counts as
+        # waiting for input.
+        paused_at = self.paused_at.pop(id(interp), None)
+        if paused_at is not None:
+            self.input_wait += self.run_started - paused_at
+
+    def record(self, interp, ip, instr):
+        self.opcode_counts[instr.opcode] += 1
+        self.ip_counts[ip] += 1
+
+    def end_run(self, interp, reason):
+        now = time.perf_counter()
+        self.run_time += now - self.run_started
+
+        memory = interp.memory
+        self.memory_high_water = max(self.memory_high_water,
+                                     len(memory.data) + len(memory.sparse))
+
+        if reason == NEEDS_INPUT:
+            self.paused_at[id(interp)] = now
+
+    @property
+    def total_steps(self):
+        return sum(self.opcode_counts.values())
+
+    def to_dict(self):
+        return {'total_steps': self.total_steps,
+                'run_time': self.run_time,
+                'input_wait': self.input_wait,
+                'memory_high_water': self.memory_high_water,
+                'opcode_counts': {opcode_names[opcode]: count for opcode,count in
+                                  self.opcode_counts.most_common()},
+                'ip_counts': {str(ip): count for ip,count in
+                              self.ip_counts.most_common()},
+               }
+
+    def save_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def report(self, num_hot = 20):
+        """
+        Returns a text report, with opcodes and the num_hot most
+        executed addresses sorted by count.
+        """
+        total = max(self.total_steps, 1)
+        lines = ['Instructions executed: {}'.format(self.total_steps),
+                 'Time running:          {:.3f} s'.format(self.run_time),
+                 'Time waiting on input: {:.3f} s'.format(self.input_wait),
+                 'Memory high-water:     {} values'.format(self.memory_high_water),
+                 '',
+                 'Opcode        count      %']
+        for opcode,count in self.opcode_counts.most_common():
+            lines.append('{:6s} {:12d} {:6.2f}'.format(
+                opcode_names[opcode], count, 100*count/total))
+
+        lines.append('')
+        lines.append('Address       count      %')
+        for ip,count in self.ip_counts.most_common(num_hot):
+            lines.append('{:6d} {:12d} {:6.2f}'.format(ip, count, 100*count/total))
+
+        return '\n'.join(lines)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    puzzle = sys.argv[1]
+    json_path = sys.argv[2] if len(sys.argv) > 2 else None
+
+    profiler = Profiler()
+    Interpreter.profiler = profiler
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        puzzle + '.py')
+    sys.argv = [path]
+    runpy.run_path(path, run_name='__main__')
+
+    print()
+    print(profiler.report())
+    if json_path is not None:
+        profiler.save_json(json_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+
+"""
+Recording and replay of the I/O of Intcode sessions.
+
+A Recorder logs each interpreter created while it is set as
+Interpreter.recorder.  A session is the initial memory, followed by
+every input read, every output written, and every snapshot taken or
+restored, in order.  Replaying a session gives the program the same
+inputs, with none of the controller that chose them, and checks that
+the outputs are unchanged.
+
+Snapshots are assumed to be taken while the interpreter is waiting
+for input, or has halted, as with TextGame.  Interpreters made by
+fork() are not recorded, and a session that restores a snapshot it
+did not take can't be replayed.
+
+Logs are stored as a sequence of variable-length integers.  Each
+distinct initial memory is stored once.  Each event is a single
+integer, holding the event type in the low two bits and the value,
+zigzag-encoded, above them.
+
+Usage: intcode_replay.py record puzzle log_path
+       intcode_replay.py replay log_path [module:Class]
+
+record runs the named day with every interpreter recorded, then
+writes the log.  replay runs every session in the log, and prints the
+time taken by each.
+"""
+
+import importlib
+import os
+import runpy
+import sys
+import time
+
+from intcode import Interpreter
+
+INPUT, OUTPUT, SNAPSHOT, RESTORE = range(4)
+
+magic = b'ICIO\x01'
+
+
+def write_varint(out, x):
+    while x >= 0x80:
+        out.append((x & 0x7f) | 0x80)
+        x >>= 7
+    out.append(x)
+
+def read_varint(data, pos):
+    x = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        x |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return x, pos
+        shift += 7
+
+def zigzag(x):
+    return 2*x if x >= 0 else -2*x - 1
+
+def unzigzag(x):
+    return x//2 if x % 2 == 0 else -(x+1)//2
+
+
+def as_int(value):
+    """
+    Returns the value as an integer.  Integral floats, such as the
+    joystick positions of d13, are accepted.
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    raise ValueError('Cannot record non-integer value: {!r}'.format(value))
+
+
+class Session:
+    def __init__(self, program, events = None, complete = True):
+        self.program = program
+        self.events = [] if events is None else events
+        self.complete = complete
+
+    @property
+    def inputs(self):
+        return [value for kind,value in self.events if kind == INPUT]
+
+    @property
+    def outputs(self):
+        return [value for kind,value in self.events if kind == OUTPUT]
+
+
+def to_bytes(sessions):
+    programs = {}
+    for session in sessions:
+        programs.setdefault(tuple(session.program), len(programs))
+
+    out = bytearray(magic)
+    write_varint(out, len(programs))
+    for program in programs:
+        write_varint(out, len(program))
+        for x in program:
+            write_varint(out, zigzag(x))
+
+    write_varint(out, len(sessions))
+    for session in sessions:
+        write_varint(out, programs[tuple(session.program)])
+        write_varint(out, int(session.complete))
+        write_varint(out, len(session.events))
+        for kind,value in session.events:
+            write_varint(out, (zigzag(value) << 2) | kind)
+    return bytes(out)
+
+def from_bytes(data):
+    if not data.startswith(magic):
+        raise ValueError('Not an Intcode I/O log')
+
+    pos = len(magic)
+    num_programs, pos = read_varint(data, pos)
+    programs = []
+    for _ in range(num_programs):
+        size, pos = read_varint(data, pos)
+        program = []
+        for _ in range(size):
+            x, pos = read_varint(data, pos)
+            program.append(unzigzag(x))
+        programs.append(program)
+
+    num_sessions, pos = read_varint(data, pos)
+    sessions = []
+    for _ in range(num_sessions):
+        index, pos = read_varint(data, pos)
+        complete, pos = read_varint(data, pos)
+        num_events, pos = read_varint(data, pos)
+        events = []
+        for _ in range(num_events):
+            x, pos = read_varint(data, pos)
+            events.append((x & 3, unzigzag(x >> 2)))
+        sessions.append(Session(list(programs[index]), events, bool(complete)))
+    return sessions
+
+def save(sessions, path):
+    with open(path, 'wb') as f:
+        f.write(to_bytes(sessions))
+
+def load(path):
+    with open(path, 'rb') as f:
+        return from_bytes(f.read())
+
+
+class Recorder:
+    """
+    Records a Session for each interpreter started while this is set
+    as Interpreter.recorder.
+    """
+    def __init__(self):
+        self.sessions = []
+        self.active = {}
+
+    def start(self, interp, memory):
+        session = Session([as_int(x) for x in memory])
+        self.sessions.append(session)
+        # The interpreter is kept, so that its id is not reused.
+        self.active[id(interp)] = (interp, session, [])
+
+    def session(self, interp):
+        entry = self.active.get(id(interp))
+        if entry is None or entry[0] is not interp:
+            return None
+        return entry[1]
+
+    def snapshots(self, interp):
+        return self.active[id(interp)][2]
+
+    def record_input(self, interp, x):
+        session = self.session(interp)
+        if session is not None:
+            session.events.append((INPUT, as_int(x)))
+
+    def record_output(self, interp, a):
+        session = self.session(interp)
+        if session is not None:
+            session.events.append((OUTPUT, as_int(a)))
+
+    def record_snapshot(self, interp, snapshot):
+        session = self.session(interp)
+        if session is not None:
+            snapshots = self.snapshots(interp)
+            session.events.append((SNAPSHOT, len(snapshots)))
+            snapshots.append(snapshot)
+
+    def record_restore(self, interp, snapshot):
+        session = self.session(interp)
+        if session is None:
+            return
+
+        index = next((i for i,s in enumerate(self.snapshots(interp))
+                      if s is snapshot), None)
+        if index is None:
+            session.complete = False
+        else:
+            session.events.append((RESTORE, index))
+
+    def save(self, path):
+        save(self.sessions, path)
+
+
+def replay(session, interpreter_class = Interpreter, verify = True):
+    """
+    Runs the program of a session with its recorded inputs, and
+    returns the interpreter.  Raises ValueError if verify is set, and
+    the outputs differ from those recorded.
+    """
+    if not session.complete:
+        raise ValueError('Session restores a snapshot it did not take')
+
+    outputs = []
+    interp = interpreter_class(session.program, output_callback=outputs.append,
+                               num_output_args=1)
+    snapshots = []
+    pending = []
+    for kind,value in session.events:
+        if kind == INPUT:
+            pending.append(value)
+        elif kind == SNAPSHOT or kind == RESTORE:
+            interp.feed(pending)
+            pending = []
+            interp.run()
+            if kind == SNAPSHOT:
+                snapshots.append(interp.snapshot())
+            else:
+                interp.restore(snapshots[value])
+
+    interp.feed(pending)
+    interp.run()
+
+    if verify and outputs != session.outputs:
+        raise ValueError('Outputs differ from the recording, after {} of {} outputs'.format(
+            next((i for i,(a,b) in enumerate(zip(outputs, session.outputs)) if a != b),
+                 min(len(outputs), len(session.outputs))),
+            len(session.outputs)))
+
+    return interp
+
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ['record'] and len(args) == 3:
+        puzzle, log_path = args[1:]
+        recorder = Recorder()
+        Interpreter.recorder = recorder
+
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            puzzle + '.py')
+        sys.argv = [path]
+        try:
+            runpy.run_path(path, run_name='__main__')
+        finally:
+            Interpreter.recorder = None
+            recorder.save(log_path)
+            print('{} sessions, {} events, {} bytes'.format(
+                len(recorder.sessions),
+                sum(len(session.events) for session in recorder.sessions),
+                os.path.getsize(log_path)))
+
+    elif args[:1] == ['replay'] and len(args) in (2, 3):
+        interpreter_class = Interpreter
+        if len(args) == 3:
+            module, name = args[2].split(':')
+            interpreter_class = getattr(importlib.import_module(module), name)
+
+        for i,session in enumerate(load(args[1])):
+            start = time.perf_counter()
+            interp = replay(session, interpreter_class)
+            elapsed = time.perf_counter() - start
+            print('Session {}: {} inputs, {} outputs, {} steps, {:.1f} ms'.format(
+                i, len(session.inputs), len(session.outputs), interp.steps,
+                1000*elapsed))
+
+    else:
+        print(__doc__)
+
+if __name__ == '__main__':
+    main()
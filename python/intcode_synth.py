@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+"""
+Synthetic Intcode workloads, of any size.
+
+Each generator returns a Workload: a program written with
+intcode_asm, the inputs to give it, and the outputs it should
+produce.  The parameters control what the program stresses.
+
+    sieve(n)        Sieve of Eratosthenes below n.  The n flags lie
+                    past the end of the program, so memory grows as
+                    they are written, unless preallocate is set.
+                    If output_all is set, every prime is output,
+                    otherwise only their count.
+    bubble_sort(n)  Bubble sort of n values, O(n^2) instructions.
+                    The values are read as input if from_input is
+                    set, otherwise they are part of the program.
+    fibonacci(n)    Recursive Fibonacci, to a call depth of n, with
+                    O(phi^n) calls.  Calls follow the convention of
+                    the puzzle programs, with the return address at
+                    [rb+0] and the argument at [rb+1].
+    stream(n, work) Reads n values, and outputs each after a loop of
+                    work iterations, to set the ratio of I/O to
+                    computation.
+
+Arrays are addressed through the relative base, as the puzzle
+programs do with their stacks, so no program writes to its own code.
+
+Usage: intcode_synth.py name size [size ...] [module:Class]
+
+Runs the named workload at each size, and prints the instructions
+executed, the time taken, and the time per instruction.  A time per
+instruction that rises with size points to a cost that is not linear.
+"""
+
+from collections import namedtuple
+import importlib
+import random
+import sys
+import time
+
+from intcode import Interpreter
+from intcode_asm import assemble
+
+Workload = namedtuple('Workload', ['name', 'program', 'inputs', 'outputs'])
+
+
+def data_lines(values, per_line = 16):
+    values = list(values)
+    return ['    .data ' + ', '.join(str(x) for x in values[i:i+per_line])
+            for i in range(0, len(values), per_line)]
+
+
+def sieve(n, output_all = False, preallocate = False):
+    source = """
+        arb  flags          ; rb = flags, outside the marking loop
+        add  2, 0, [i]
+    outer:
+        lt   [i], [n], [f]
+        jz   [f], done
+        arb  [i]
+        add  [rb+0], 0, [f]
+        mul  [i], -1, [d]
+        arb  [d]
+        jnz  [f], next
+        add  [count], 1, [count]
+        {out_prime}
+        mul  [i], [i], [j]
+        lt   [j], [n], [f]
+        jz   [f], next
+        arb  [j]
+    mark:                   ; rb = flags + j
+        add  1, 0, [rb+0]
+        arb  [i]
+        add  [j], [i], [j]
+        lt   [j], [n], [f]
+        jnz  [f], mark
+        mul  [j], -1, [d]
+        arb  [d]
+    next:
+        add  [i], 1, [i]
+        jz   0, outer
+    done:
+        out  [count]
+        halt
+
+    n:     .data {n}
+    i:     .data 0
+    j:     .data 0
+    f:     .data 0
+    d:     .data 0
+    count: .data 0
+    flags: {flags}
+    """.format(n=n,
+               out_prime='out  [i]' if output_all else '',
+               flags='.zero {}'.format(n) if preallocate and n > 0 else '')
+
+    is_prime = [True]*max(n, 2)
+    primes = []
+    for i in range(2, n):
+        if is_prime[i]:
+            primes.append(i)
+            for j in range(i*i, n, i):
+                is_prime[j] = False
+
+    outputs = (primes if output_all else []) + [len(primes)]
+    return Workload('sieve', assemble(source), [], outputs)
+
+
+def bubble_sort(n, from_input = False, seed = 0):
+    rng = random.Random(seed)
+    values = [rng.randrange(-1000, 1000) for _ in range(n)]
+
+    if from_input:
+        read_values = """
+        add  0, 0, [k]
+    read:
+        lt   [k], [n], [f]
+        jz   [f], read_done
+        in   [rb+0]
+        arb  1
+        add  [k], 1, [k]
+        jz   0, read
+    read_done:
+        mul  [k], -1, [d]
+        arb  [d]
+        """
+        array = ''
+        inputs = values
+    else:
+        read_values = ''
+        array = '\n'.join(data_lines(values))
+        inputs = []
+
+    source = """
+        arb  array
+        {read_values}
+        add  [n], -1, [last]
+    pass:                   ; rb = array, outside the inner loops
+        lt   0, [last], [f]
+        jz   [f], sorted
+        add  0, 0, [k]
+    step:                   ; rb = array + k
+        lt   [rb+1], [rb+0], [f]
+        jz   [f], no_swap
+        add  [rb+0], 0, [t]
+        add  [rb+1], 0, [rb+0]
+        add  [t], 0, [rb+1]
+    no_swap:
+        arb  1
+        add  [k], 1, [k]
+        lt   [k], [last], [f]
+        jnz  [f], step
+        mul  [k], -1, [d]
+        arb  [d]
+        add  [last], -1, [last]
+        jz   0, pass
+    sorted:
+        add  0, 0, [k]
+    write:
+        lt   [k], [n], [f]
+        jz   [f], done
+        out  [rb+0]
+        arb  1
+        add  [k], 1, [k]
+        jz   0, write
+    done:
+        halt
+
+    n:    .data {n}
+    last: .data 0
+    k:    .data 0
+    f:    .data 0
+    d:    .data 0
+    t:    .data 0
+    array:
+    {array}
+    """.format(n=n, read_values=read_values, array=array)
+
+    return Workload('bubble_sort', assemble(source), inputs, sorted(values))
+
+
+def fibonacci(n):
+    source = """
+        arb  stack
+        add  {n}, 0, [rb+1]
+        add  0, main_ret, [rb+0]
+        jz   0, fib
+    main_ret:
+        out  [rb+1]
+        halt
+
+    fib:                    ; fib(n), with n in [rb+1], returned in place
+        arb  3
+        lt   [rb-2], 2, [rb-1]
+        jnz  [rb-1], fib_ret
+        add  [rb-2], -1, [rb+1]
+        add  0, fib_ret1, [rb+0]
+        jz   0, fib
+    fib_ret1:
+        add  [rb+1], 0, [rb-1]
+        add  [rb-2], -2, [rb+1]
+        add  0, fib_ret2, [rb+0]
+        jz   0, fib
+    fib_ret2:
+        add  [rb+1], [rb-1], [rb-2]
+    fib_ret:
+        arb  -3
+        jz   0, [rb+0]
+
+    stack:
+    """.format(n=n)
+
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a+b
+    return Workload('fibonacci', assemble(source), [], [a])
+
+
+def stream(n, work = 1):
+    source = """
+    loop:
+        lt   [count], {n}, [f]
+        jz   [f], done
+        in   [x]
+        add  0, 0, [k]
+    work:
+        lt   [k], {work}, [f]
+        jz   [f], work_done
+        add  [x], [k], [x]
+        add  [k], 1, [k]
+        jz   0, work
+    work_done:
+        out  [x]
+        add  [count], 1, [count]
+        jz   0, loop
+    done:
+        halt
+
+    count: .data 0
+    x:     .data 0
+    k:     .data 0
+    f:     .data 0
+    """.format(n=n, work=work)
+
+    inputs = list(range(n))
+    total = sum(range(work))
+    return Workload('stream', assemble(source), inputs,
+                    [x + total for x in inputs])
+
+
+generators = {'sieve': sieve,
+              'bubble_sort': bubble_sort,
+              'fibonacci': fibonacci,
+              'stream': stream,
+             }
+
+
+def run(workload, interpreter_class = Interpreter):
+    """
+    Runs a workload, and returns the interpreter.  Raises ValueError
+    if the outputs are not those expected.
+    """
+    outputs = []
+    interp = interpreter_class(workload.program, output_callback=outputs.append,
+                               num_output_args=1)
+    interp.feed(workload.inputs)
+    interp.run()
+
+    if not interp.done:
+        raise ValueError('{} did not halt'.format(workload.name))
+    if outputs != workload.outputs:
+        raise ValueError('{} gave the wrong outputs'.format(workload.name))
+    return interp
+
+
+def main():
+    args = sys.argv[1:]
+    interpreter_class = Interpreter
+    if args and ':' in args[-1]:
+        module, name = args.pop().split(':')
+        interpreter_class = getattr(importlib.import_module(module), name)
+
+    if len(args) < 2 or args[0] not in generators:
+        print(__doc__)
+        return
+
+    generator = generators[args[0]]
+    print('{:>8s} {:>12s} {:>9s} {:>10s}'.format(
+        'size', 'instructions', 'time (s)', 'ns/instr'))
+    for size in args[1:]:
+        workload = generator(int(size))
+        start = time.perf_counter()
+        interp = run(workload, interpreter_class)
+        elapsed = time.perf_counter() - start
+        print('{:>8s} {:12d} {:9.3f} {:10.1f}'.format(
+            size, interp.steps, elapsed, 1e9*elapsed/max(interp.steps, 1)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+Tracing of the most recent Intcode instructions executed.
+
+A Tracer keeps the last N instructions in a ring buffer, each as the
+address, the opcode, the operands, and the value written to memory or
+output.  Tracing is switched on by giving an interpreter a tracer, and
+off by setting it back to None.  While no interpreter has a tracer,
+run() uses its normal loop, which has no tracing checks at all.
+
+Usage: intcode_trace.py puzzle [size]
+
+Runs the named day, for example d25, with one tracer shared by every
+interpreter, then prints the last size instructions executed.  The
+trace is printed even if the day raises an exception.
+"""
+
+from collections import namedtuple
+import os
+import runpy
+import sys
+
+from intcode import Interpreter, opcode_names
+
+
+TraceEntry = namedtuple('TraceEntry', ['ip', 'opcode', 'operands', 'written'])
+
+
+class Tracer:
+    def __init__(self, size = 1000):
+        self.size = size
+        self.entries = [None]*size
+        self.count = 0
+
+    def record(self, ip, opcode, operands, written):
+        self.entries[self.count % self.size] = TraceEntry(ip, opcode, operands, written)
+        self.count += 1
+
+    def clear(self):
+        self.entries = [None]*self.size
+        self.count = 0
+
+    def last(self, n = None):
+        """
+        Returns the last n entries recorded, or all that are still
+        held, oldest first.
+        """
+        held = min(self.count, self.size)
+        if n is None or n > held:
+            n = held
+
+        start = self.count - n
+        return [self.entries[i % self.size] for i in range(start, self.count)]
+
+    def format(self, n = None):
+        lines = []
+        for entry in self.last(n):
+            line = '{:6d}  {:4s} {}'.format(
+                entry.ip, opcode_names[entry.opcode],
+                ', '.join(str(x) for x in entry.operands))
+            if entry.written is not None:
+                line = '{:40s} -> {}'.format(line, entry.written)
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    puzzle = sys.argv[1]
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    tracer = Tracer(size)
+    Interpreter.tracer = tracer
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        puzzle + '.py')
+    sys.argv = [path]
+    try:
+        runpy.run_path(path, run_name='__main__')
+    finally:
+        print()
+        print('Last {} of {} instructions executed:'.format(
+            min(tracer.count, size), tracer.count))
+        print(tracer.format())
+
+if __name__ == '__main__':
+    main()
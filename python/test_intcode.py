@@ -0,0 +1,134 @@
+"""
+Checks that the faster interpreters behave exactly as the plain
+Interpreter does, on programs that modify their own code.
+
+Run from this directory, with `python3 -m unittest test_intcode`.
+"""
+
+import random
+import tempfile
+import unittest
+
+from intcode import (HALTED, NEEDS_INPUT, STEP_LIMIT, Interpreter,
+                     instruction_sizes, output_params)
+from intcode_aot import AotInterpreter
+from intcode_disasm import Program
+from intcode_jit import BlockInterpreter
+
+
+def run(interpreter_class, program, inputs = (), max_steps = 1000, **kwargs):
+    """
+    Returns the reason the program stopped, or the type of exception
+    it raised, along with the steps executed and the outputs.
+    """
+    outputs = []
+    interp = interpreter_class(list(program), output_callback=outputs.append,
+                               num_output_args=1, **kwargs)
+    interp.feed(inputs)
+    try:
+        reason = interp.run(max_steps)
+    except (IndexError, ValueError) as e:
+        return type(e), outputs
+    return reason, interp.steps, outputs
+
+
+def random_program(rng, length = 48):
+    """
+    Returns a program of mostly valid instructions.  Their parameters
+    mostly point back into the program, so it often writes to its own
+    code and jumps into the middle of other instructions.
+    """
+    opcodes = [1, 2, 3, 4, 5, 6, 7, 8, 9, 1, 2, 5, 6, 99]
+    program = []
+    while len(program) < length:
+        if rng.random() < 0.25:
+            program.append(rng.randrange(-5, 60))
+            continue
+
+        opcode = rng.choice(opcodes)
+        value = opcode
+        for i in range(1, instruction_sizes[opcode]):
+            modes = (0, 2) if i == output_params.get(opcode) else (0, 1, 2)
+            value += rng.choice(modes) * 10**(i+1)
+        program.append(value)
+        program.extend(rng.randrange(-2, length)
+                       for _ in range(instruction_sizes[opcode]-1))
+    return program[:length]
+
+
+class MatchesInterpreter(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def check(self, program, inputs = (), max_steps = 1000):
+        expected = run(Interpreter, program, inputs, max_steps)
+        self.assertEqual(run(BlockInterpreter, program, inputs, max_steps),
+                         expected)
+        self.assertEqual(run(AotInterpreter, program, inputs, max_steps,
+                             cache_dir=self.cache_dir.name),
+                         expected)
+        return expected
+
+    def test_write_to_volatile_opcode(self):
+        # Location 11 is a parameter of the instruction at 10, and is
+        # written by the instructions at 30 and 40.  It is also the
+        # opcode of the block at 11, which must be discarded when the
+        # output instruction there is replaced by a halt.
+        program = [0]*48
+        program[0:3] = [1105, 1, 10]
+        program[10:14] = [1101, 0, 0, 1105]
+        program[14:17] = [1105, 40, 30]
+        program[30:34] = [1101, 104, 0, 11]
+        program[34:37] = [1105, 1, 11]
+        program[40:44] = [1101, 99, 0, 11]
+        program[44:47] = [1105, 1, 11]
+        self.assertEqual(self.check(program), (HALTED, 9, [0]))
+
+    def test_step_limit_before_invalid_code(self):
+        # The jump lands on location 22008, which holds no valid
+        # instruction, but the step limit is reached first.
+        program = [5, 5, 7, 40, 1206, 40, 47, 22008]
+        self.assertEqual(self.check(program, max_steps=1),
+                         (STEP_LIMIT, 1, []))
+
+    def test_untaken_jump_to_negative_address(self):
+        # The target of the jump at 4 is overwritten to read [rb-1].
+        # The jump is not taken, but the target is still read.
+        program = [1101, 0, -1, 6, 2106, 1, 0, 104, 7, 99]
+        self.assertEqual(self.check(program), (IndexError, []))
+        self.assertEqual(self.check(program[:3] + [5] + program[4:]),
+                         (HALTED, 3, [7]))
+
+    def test_write_to_translated_code(self):
+        program = [104, 3, 1, 9, 51, 7, 1105, 0, 3, 5, 42, 51, 105, 3, 36, 3,
+                   6, 6, 4, 43, 1002, 3, 10, 34, 1001, 11, 0, 8, 21202, 46,
+                   1, 22, 1001, 12, 1, 6, 21008, 24, 1, -2, 206, 15, 25,
+                   21107, 32, 1, 14]
+        self.assertEqual(self.check(program), (NEEDS_INPUT, 10, [3, 3]))
+
+    def test_random_programs(self):
+        for seed in range(300):
+            rng = random.Random(seed)
+            program = random_program(rng)
+            inputs = [rng.randrange(-3, 50) for _ in range(5)]
+            max_steps = rng.choice([1, 7, 50, 300])
+            with self.subTest(seed=seed, program=program):
+                self.check(program, inputs, max_steps)
+
+
+class ProgramTest(unittest.TestCase):
+    def test_jump_outside_program(self):
+        # Neither jump target is code, and -1 must not be read as the
+        # last location of the program.
+        for target in (-1, 8):
+            program = Program([1106, 0, target, 2, 0, 0, 0, 99])
+            self.assertEqual(set(program.instrs), {0})
+            self.assertEqual(program.jump_targets, set())
+            self.assertEqual(program.successors(0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()